@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import List
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_TARGETS = ["main", "stock_data.stocks", "prediction.stock_prediction", "graph.stock_graph", "user.user"]
+HEAVY_MODULES = ["tensorflow", "keras", "yfinance", "pyqtgraph"]
+
+# Runs in a fresh interpreter, so that nothing is cached by earlier imports
+PROBE = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import {target}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy_modules!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(target: str, repeats: int = 3) -> dict:
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(target=target, heavy_modules=HEAVY_MODULES)],
+                                cwd=ROOT_DIRECTORY, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "target": target,
+        "seconds": min(run["seconds"] for run in runs),
+        "loaded_heavy_modules": runs[0]["loaded"]
+    }
+
+
+def run_benchmark(targets: List[str], repeats: int = 3) -> List[dict]:
+    return [measure_import(target, repeats) for target in targets]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the import time of the GUI modules")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    arguments = parser.parse_args()
+
+    results = run_benchmark(arguments.targets, arguments.repeats)
+    for result in results:
+        print(f"{result['target']:<32} {result['seconds'] * 1000:8.1f} ms  "
+              f"heavy: {', '.join(result['loaded_heavy_modules']) or '-'}")
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy
+import pandas as pd
+
+from prediction.forecast_cache import ForecastCache
+from prediction.forecasters import FORECASTERS, NETWORK_FORECASTER, Forecaster, create_forecaster
+from prediction.stock_prediction import StockPrediction
+from prediction.training import TrainingStock
+from stock_data.price_store import PriceStore
+from stock_data.price_table import PriceTable
+from stock_data.stocks import TARGET_INDEX
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_HORIZONS = [7, 30, 90]
+DEFAULT_FOLDS = 3
+DEFAULT_REPEATS = 3
+DEFAULT_INPUT_PERIOD = 28
+DEFAULT_FIXTURE_STOCKS = 10
+DEFAULT_FIXTURE_DAYS = 1500
+
+# Every model factory creates one forecaster for a list of stocks
+MODELS: Dict[str, Callable[[List[TrainingStock], int], Forecaster]] = {
+    NETWORK_FORECASTER: lambda stocks, input_period: StockPrediction(stocks, days_input_period=input_period)
+}
+for forecaster_name in FORECASTERS:
+    MODELS[forecaster_name] = lambda stocks, input_period, name=forecaster_name: create_forecaster(name, stocks)
+
+
+def create_fixture_data(stock_count: int = DEFAULT_FIXTURE_STOCKS, days: int = DEFAULT_FIXTURE_DAYS,
+                        seed: int = 0) -> pd.DataFrame:
+    # Deterministic random walks in the yfinance.download layout, so the benchmark never needs the network
+    generator = numpy.random.default_rng(seed)
+    time_stamps = pd.date_range("2010-01-01", periods=days, freq="D")
+    returns = generator.normal(0.0002, 0.015, (days, stock_count))
+    prices = numpy.exp(numpy.cumsum(returns, axis=0)) * generator.uniform(10, 500, stock_count)
+    stock_names = [f"FIXTURE{i}" for i in range(stock_count)]
+    return pd.DataFrame(prices, index=time_stamps,
+                        columns=pd.MultiIndex.from_product([[TARGET_INDEX], stock_names]))
+
+
+def get_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIRECTORY,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def get_max_rss() -> int:
+    # Peak resident memory of the process, including native TensorFlow allocations
+    try:
+        import resource
+    except ImportError:
+        return -1
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def get_cutoffs(length: int, horizon: int, folds: int, step: int) -> List[int]:
+    # Walk-forward origins, the last fold ends with the last known price
+    return [length - horizon - (folds - 1 - fold) * step for fold in range(folds)]
+
+
+def run_backtest(price_table: PriceTable, model_name: str, horizons: List[int], folds: int = DEFAULT_FOLDS,
+                 step: int = None, repeats: int = DEFAULT_REPEATS, universe: bool = False,
+                 input_period: int = DEFAULT_INPUT_PERIOD) -> dict:
+    create_model = MODELS[model_name]
+    horizons = sorted(horizons)
+    step = horizons[-1] if step is None else step
+    stock_names = price_table.get_stock_names()
+    time_stamps = price_table.get_time_stamps()
+
+    training_seconds = []
+    latencies: Dict[int, List[float]] = {horizon: [] for horizon in horizons}
+    errors: Dict[int, List[numpy.ndarray]] = {horizon: [] for horizon in horizons}
+    relative_errors: Dict[int, List[numpy.ndarray]] = {horizon: [] for horizon in horizons}
+    failed = {horizon: 0 for horizon in horizons}
+
+    for cutoff in get_cutoffs(len(time_stamps), horizons[-1], folds, step):
+        if cutoff <= input_period:
+            raise ValueError(f"Not enough history for {folds} folds with a horizon of {horizons[-1]} days")
+        stocks = [TrainingStock(stock_name, price_table.get_prices(stock_name)[:cutoff], time_stamps[:cutoff])
+                  for stock_name in stock_names]
+        groups = [stocks] if universe else [[stock] for stock in stocks]
+        for group in groups:
+            start = time.perf_counter()
+            model = create_model(group, input_period)
+            training_seconds.append(time.perf_counter() - start)
+
+            group_names = [stock.get_name() for stock in group]
+            for horizon in horizons:
+                for _ in range(repeats):
+                    # Measure the forecast itself, not the forecast cache
+                    model.forecast_cache = ForecastCache()
+                    start = time.perf_counter()
+                    predictions = model.predict_future_stocks_prices(group_names, horizon)
+                    latencies[horizon].append((time.perf_counter() - start) / len(group_names))
+
+                for stock_name in group_names:
+                    prediction = numpy.asarray(predictions[stock_name], dtype=numpy.float64)
+                    actual = price_table.get_prices(stock_name)[cutoff:cutoff + horizon]
+                    if len(prediction) != horizon:
+                        failed[horizon] += 1
+                        continue
+                    valid = ~numpy.isnan(actual) & (actual != 0)
+                    errors[horizon].append(numpy.abs(prediction[valid] - actual[valid]))
+                    relative_errors[horizon].append(errors[horizon][-1] / numpy.abs(actual[valid]))
+
+    results = {}
+    for horizon in horizons:
+        horizon_latencies = numpy.array(latencies[horizon])
+        horizon_errors = numpy.concatenate(errors[horizon]) if len(errors[horizon]) > 0 else numpy.empty(0)
+        horizon_relative_errors = numpy.concatenate(relative_errors[horizon]) \
+            if len(relative_errors[horizon]) > 0 else numpy.empty(0)
+        results[str(horizon)] = {
+            "forecasts": len(errors[horizon]),
+            "failed": failed[horizon],
+            "latency_ms_mean": float(horizon_latencies.mean() * 1000),
+            "latency_ms_p95": float(numpy.percentile(horizon_latencies, 95) * 1000),
+            "forecasts_per_second": float(1 / horizon_latencies.mean()) if horizon_latencies.mean() > 0 else None,
+            "mae": float(horizon_errors.mean()) if len(horizon_errors) > 0 else None,
+            "mape": float(horizon_relative_errors.mean() * 100) if len(horizon_relative_errors) > 0 else None
+        }
+    return {
+        "models_trained": len(training_seconds),
+        "training_seconds": float(numpy.sum(training_seconds)),
+        "training_seconds_per_model": float(numpy.mean(training_seconds)),
+        "horizons": results
+    }
+
+
+def get_model_arguments(arguments: argparse.Namespace, model_name: str) -> List[str]:
+    # Command line of the process that benchmarks a single model
+    model_arguments = ["--models", model_name, "--horizons"] + [str(horizon) for horizon in arguments.horizons] + \
+                      ["--folds", str(arguments.folds), "--repeats", str(arguments.repeats),
+                       "--input-period", str(arguments.input_period), "--fixture-stocks", str(arguments.fixture_stocks),
+                       "--fixture-days", str(arguments.fixture_days), "--seed", str(arguments.seed), "--model-process"]
+    if arguments.store is not None:
+        model_arguments += ["--store", os.path.abspath(arguments.store), "--tickers"] + arguments.tickers
+    if arguments.step is not None:
+        model_arguments += ["--step", str(arguments.step)]
+    if arguments.universe:
+        model_arguments.append("--universe")
+    return model_arguments
+
+
+def run_model_process(arguments: argparse.Namespace, model_name: str) -> dict:
+    # Every model runs in a fresh interpreter, so that its peak memory is not hidden by the models before it
+    output = subprocess.run([sys.executable, "-m", "benchmarks.prediction"] + get_model_arguments(arguments, model_name),
+                            cwd=ROOT_DIRECTORY, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def load_price_table(arguments: argparse.Namespace) -> PriceTable:
+    if arguments.store is None:
+        return PriceTable(create_fixture_data(arguments.fixture_stocks, arguments.fixture_days, arguments.seed))
+    # Only reads what is already stored, never downloads
+    data = PriceStore(arguments.store).get_data(arguments.tickers)
+    if data.empty:
+        raise ValueError(f"No stored prices for {arguments.tickers} in {arguments.store}")
+    return PriceTable(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the prediction models")
+    parser.add_argument("--store", help="Price store directory, a generated fixture is used when omitted")
+    parser.add_argument("--tickers", nargs="*", default=[], help="Stock names to read from the price store")
+    parser.add_argument("--models", nargs="*", default=list(MODELS.keys()), choices=list(MODELS.keys()))
+    parser.add_argument("--horizons", nargs="*", type=int, default=DEFAULT_HORIZONS)
+    parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS)
+    parser.add_argument("--step", type=int, help="Days between two folds, defaults to the longest horizon")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--input-period", type=int, default=DEFAULT_INPUT_PERIOD)
+    parser.add_argument("--universe", action="store_true", help="Train one model on all stocks of a fold")
+    parser.add_argument("--fixture-stocks", type=int, default=DEFAULT_FIXTURE_STOCKS)
+    parser.add_argument("--fixture-days", type=int, default=DEFAULT_FIXTURE_DAYS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--model-process", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    price_table = load_price_table(arguments)
+    if arguments.model_process:
+        result = run_backtest(price_table, arguments.models[0], arguments.horizons, arguments.folds, arguments.step,
+                              arguments.repeats, arguments.universe, arguments.input_period)
+        result["max_rss_bytes"] = get_max_rss()
+        print(json.dumps(result))
+        sys.exit(0)
+
+    report = {
+        "revision": get_revision(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "stocks": len(price_table.get_stock_names()),
+        "days": len(price_table.get_time_stamps()),
+        "folds": arguments.folds,
+        "universe": arguments.universe,
+        "input_period": arguments.input_period,
+        "models": {}
+    }
+    for model_name in arguments.models:
+        report["models"][model_name] = run_model_process(arguments, model_name)
+        result = report["models"][model_name]
+        print(f"{model_name}: trained {result['models_trained']} models in {result['training_seconds']:.2f} s, "
+              f"peak memory {result['max_rss_bytes'] / 2 ** 20:.0f} MiB")
+        for horizon, metrics in result["horizons"].items():
+            print(f"  {horizon:>4} days: {metrics['latency_ms_mean']:8.3f} ms/forecast "
+                  f"{metrics['forecasts_per_second'] or 0:10.1f} forecasts/s  MAE {metrics['mae']}  "
+                  f"MAPE {metrics['mape']}  failed {metrics['failed']}")
+
+    if arguments.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,72 @@
+from typing import List
+
+import numpy
+import pyqtgraph
+
+from util.util import time_stamp_to_string
+
+DAY = numpy.timedelta64(1, "D")
+MONTH_STEPS = [1, 2, 3, 6, 12, 24, 60, 120]
+DAY_STEPS = [1, 2, 7, 14]
+MONDAY_OFFSET = 3  # The first day of numpy time, 1.1.1970, is a Thursday
+TICK_SPACING = 90  # Minimum pixels per label
+
+
+def get_day_positions(time_stamps: numpy.ndarray, origin: numpy.datetime64) -> numpy.ndarray:
+    # X positions of all graphs are days since the same origin, so series of different length line up
+    return (numpy.asarray(time_stamps, dtype="datetime64[ns]") - origin) / DAY
+
+
+def get_month_boundaries(origin: numpy.datetime64, start: float, end: float, max_ticks: int) -> numpy.ndarray:
+    # Positions of the first days of the months between start and end, thinned out to at most max_ticks
+    first = (origin + numpy.timedelta64(int(numpy.floor(start)), "D")).astype("datetime64[M]") + 1
+    last = (origin + numpy.timedelta64(int(numpy.ceil(end)), "D")).astype("datetime64[M]")
+    months = numpy.arange(first, last + 1)
+    step = next((step for step in MONTH_STEPS if len(months) <= step * max_ticks), MONTH_STEPS[-1])
+    months = months[months.astype(numpy.int64) % step == 0]
+    positions = get_day_positions(months, origin)
+    return positions[(positions >= start) & (positions <= end)]
+
+
+def get_day_boundaries(origin: numpy.datetime64, start: float, end: float, max_ticks: int) -> numpy.ndarray:
+    # Positions of days between start and end, thinned out to every second day or to weeks starting on Monday
+    first = (origin + numpy.timedelta64(int(numpy.ceil(start)), "D")).astype("datetime64[D]")
+    last = (origin + numpy.timedelta64(int(numpy.floor(end)), "D")).astype("datetime64[D]")
+    days = numpy.arange(first, last + 1)
+    step = next((step for step in DAY_STEPS if len(days) <= step * max_ticks), DAY_STEPS[-1])
+    days = days[(days.astype(numpy.int64) + MONDAY_OFFSET) % step == 0]
+    positions = get_day_positions(days, origin)
+    return positions[(positions >= start) & (positions <= end)]
+
+
+def get_tick_positions(origin: numpy.datetime64, start: float, end: float, max_ticks: int) -> numpy.ndarray:
+    # Short ranges contain less than two month boundaries, they are labeled by days or weeks instead. If even
+    # that is not possible, the ends of the range are labeled
+    positions = get_month_boundaries(origin, start, end, max_ticks)
+    if len(positions) < 2:
+        positions = get_day_boundaries(origin, start, end, max_ticks)
+    if len(positions) < 2:
+        positions = numpy.array([start, end])
+    return positions
+
+
+class MonthAxisItem(pyqtgraph.AxisItem):
+    # Labels the visible month boundaries, or days for short ranges, recalculated whenever the view range changes
+
+    def __init__(self, origin: numpy.datetime64, orientation: str = "bottom", **kwargs):
+        super(MonthAxisItem, self).__init__(orientation, **kwargs)
+        self.origin = numpy.datetime64(origin, "ns")
+
+    def set_origin(self, origin: numpy.datetime64):
+        self.origin = numpy.datetime64(origin, "ns")
+        self.picture = None  # Labels are cached in the picture of the axis
+        self.update()
+
+    def tickValues(self, minVal: float, maxVal: float, size: float) -> list:
+        if not numpy.isfinite(minVal) or not numpy.isfinite(maxVal) or maxVal <= minVal:
+            return []
+        positions = get_tick_positions(self.origin, minVal, maxVal, max(1, int(size // TICK_SPACING)))
+        return [(30.0, positions.tolist())]
+
+    def tickStrings(self, values: List[float], scale: float, spacing: float) -> List[str]:
+        return [time_stamp_to_string(self.origin + numpy.timedelta64(int(round(value)), "D")) for value in values]
@@ -0,0 +1,46 @@
+import numpy
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+SPARKLINE_MARGIN = 6
+SPARKLINE_COLOR = "black"
+
+
+def create_sparkline(prices: numpy.ndarray, rect: QtCore.QRectF) -> QtGui.QPolygonF:
+    # Scales the prices into the rect, the highest price at the top
+    prices = numpy.asarray(prices, dtype=numpy.float64)
+    prices = prices[~numpy.isnan(prices)]
+    if len(prices) < 2:
+        return QtGui.QPolygonF()
+    low = prices.min()
+    height = prices.max() - low
+    x = rect.left() + numpy.arange(len(prices)) * (rect.width() / (len(prices) - 1))
+    y = rect.bottom() - (prices - low) * (rect.height() / height if height > 0 else 0)
+    if height == 0:
+        y -= rect.height() / 2
+    return QtGui.QPolygonF([QtCore.QPointF(point_x, point_y) for point_x, point_y in zip(x, y)])
+
+
+class SparklineDelegate(QtWidgets.QStyledItemDelegate):
+    # Paints the price array of a cell directly, no widget per row
+
+    def __init__(self, role: int, parent: QtCore.QObject = None):
+        super(SparklineDelegate, self).__init__(parent)
+        self.role = role
+        self.pen = QtGui.QPen(QtGui.QColor(SPARKLINE_COLOR))
+        self.pen.setWidthF(1.5)
+
+    def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex):
+        super(SparklineDelegate, self).paint(painter, option, index)
+        prices = index.data(self.role)
+        if prices is None:
+            return
+        rect = QtCore.QRectF(option.rect).adjusted(SPARKLINE_MARGIN, SPARKLINE_MARGIN,
+                                                   -SPARKLINE_MARGIN, -SPARKLINE_MARGIN)
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        painter.setPen(self.pen)
+        painter.drawPolyline(create_sparkline(prices, rect))
+        painter.restore()
+
+    def sizeHint(self, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> QtCore.QSize:
+        return QtCore.QSize(160, 40)
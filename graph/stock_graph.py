@@ -1,25 +1,10 @@
 from typing import List
 
 import numpy
-import pandas as pd
-import pyqtgraph
 
-from util.util import time_stamp_to_string, expand_time_stamps
+from util.lazy import LazyModule
 
-
-def create_axis_ticks(time_stamps: List[numpy.datetime64]) -> dict:
-    content = [time_stamp_to_string(time_stamps[0])]
-
-    for i in range(1, len(time_stamps) - 1):
-        stamp = pd.Timestamp(time_stamps[i])
-        if stamp.day == 1 or (stamp.day == stamp.days_in_month // 2 and False):
-            content.append(time_stamp_to_string(stamp))
-        else:
-            content.append("")
-
-    content.append(time_stamp_to_string(time_stamps[-1]))
-    content = dict(enumerate(content))
-    return content
+pyqtgraph = LazyModule("pyqtgraph")
 
 
 COLORS = ["red", "blue"]
@@ -27,52 +12,91 @@ COMPARE_COLORS = ["green", "blue", "cyan", "magenta", "yellow", "gray", "darkRed
                   "darkMagenta", "darkGray", "lightGray"]
 
 
-class StockGraph:
-
-    def __init__(self, x: List[numpy.datetime64], y: List[float]):
-        self.graph = pyqtgraph.PlotWidget()
-        self.graph.setBackground(background='white')
-        axis = self.graph.getAxis('bottom')
-        x_content = create_axis_ticks(x)
-        axis.setTicks([x_content.items()])
-        self.graph.plot(list(x_content.keys()), y)
-
-    def get_widget(self):
-        return self.graph
+def get_series_key(time_stamps: numpy.ndarray) -> tuple:
+    # Two series with the same key share their x positions
+    if len(time_stamps) == 0:
+        return (0,)
+    return len(time_stamps), time_stamps[0], time_stamps[-1]
 
 
 class StockPredictionGraph:
+    # Kept for the lifetime of the window, only curves whose data changed are updated
 
-    def __init__(self, history_x: List[numpy.datetime64], history_y: List[float], prediction_y: List[float],
-                 compare_x=None, compare_y=None):
+    def __init__(self):
+        # Imported here, so that pyqtgraph is only loaded with the first graph
+        from graph.month_axis import MonthAxisItem
 
-        if compare_y is None:
-            compare_y = []
-        if compare_x is None:
-            compare_x = []
-
-        self.graph = pyqtgraph.PlotWidget()
+        self.axis = MonthAxisItem(numpy.datetime64(0, "ns"))
+        self.graph = pyqtgraph.PlotWidget(axisItems={"bottom": self.axis})
         self.graph.setBackground(background='white')
-
-        # Calculate prediction values
-        ticks = list(history_x)
-        prediction_x = []
-        if len(prediction_y) > 0:
-            prediction_x: List[numpy.datetime64] = expand_time_stamps(history_x, len(prediction_y))
-            prediction_x = list(prediction_x)[-(len(prediction_y) + 1):]
-            prediction_y.insert(0, history_y[-1])
-            prediction_y = pd.Series(prediction_y, index=prediction_x)
-            ticks.extend(prediction_x)
-
-        axis = self.graph.getAxis('bottom')
-        x_content = create_axis_ticks(ticks)
-        axis.setTicks([x_content.items()])
-
-        self.graph.plot(history_x, history_y, pen=pyqtgraph.mkPen('black'))
-        if len(prediction_y) > 0:
-            self.graph.plot(prediction_x, prediction_y, pen=pyqtgraph.mkPen('red'))
-        for i in range(min(len(compare_x), len(COMPARE_COLORS))):
-            self.graph.plot(compare_x[i], compare_y[i], pen=pyqtgraph.mkPen(COMPARE_COLORS[i]))
+        # Only the visible part is drawn, reduced to the minimum and maximum of every pixel column
+        self.graph.getPlotItem().setDownsampling(auto=True, mode="peak")
+        self.graph.getPlotItem().setClipToView(True)
+
+        self.history = self.graph.plot(pen=pyqtgraph.mkPen('black'))
+        self.prediction = self.graph.plot(pen=pyqtgraph.mkPen('red'))
+        # Mapping of [StockName: str, PlotDataItem] in the order the curves were added
+        self.compare_curves = {}
+        self.compare_keys = {}
+        self.compare_colors = {}
+        self.history_key = None
+        self.history_positions = numpy.empty(0)
+        self.history_prices = numpy.empty(0)
+        self.prediction_values: List[float] = []
+
+    def set_data(self, stock_name: str, history_x: numpy.ndarray, history_y: numpy.ndarray,
+                 prediction_y: List[float], compare_stocks: dict = None):
+        # compare_stocks maps the names of the compared stocks to their time stamps and prices
+        from graph.month_axis import get_day_positions
+
+        if compare_stocks is None:
+            compare_stocks = {}
+
+        history_key = (stock_name,) + get_series_key(history_x)
+        origin_changed = self.history_key is None or self.history_key[1:] != history_key[1:]
+        if history_key != self.history_key:
+            if origin_changed:
+                self.axis.set_origin(history_x[0] if len(history_x) > 0 else 0)
+            self.history_key = history_key
+            self.history_positions = get_day_positions(history_x, self.axis.origin)
+            self.history_prices = numpy.asarray(history_y, dtype=numpy.float64)
+            self.history.setData(self.history_positions, self.history_prices)
+            self.prediction_values = None
+            self.graph.enableAutoRange()
+
+        if list(prediction_y) != self.prediction_values:
+            self.prediction_values = list(prediction_y)
+            if len(prediction_y) > 0 and len(self.history_prices) > 0:
+                # The prediction continues daily from the last known price
+                self.prediction.setData(self.history_positions[-1] + numpy.arange(len(prediction_y) + 1),
+                                        numpy.concatenate([self.history_prices[-1:], prediction_y]))
+            else:
+                self.prediction.setData([], [])
+
+        for compare_name in [name for name in self.compare_curves if name not in compare_stocks]:
+            self.graph.removeItem(self.compare_curves.pop(compare_name))
+            del self.compare_keys[compare_name]
+            del self.compare_colors[compare_name]
+        for compare_name, (compare_x, compare_y) in compare_stocks.items():
+            compare_key = get_series_key(compare_x)
+            if compare_name in self.compare_curves:
+                if origin_changed or self.compare_keys[compare_name] != compare_key:
+                    self.compare_curves[compare_name].setData(get_day_positions(compare_x, self.axis.origin),
+                                                              compare_y)
+                    self.compare_keys[compare_name] = compare_key
+                continue
+            color = self.get_free_color()
+            if color is None:
+                continue
+            self.compare_curves[compare_name] = self.graph.plot(get_day_positions(compare_x, self.axis.origin),
+                                                                compare_y, pen=pyqtgraph.mkPen(color))
+            self.compare_keys[compare_name] = compare_key
+            self.compare_colors[compare_name] = color
+
+    def get_free_color(self):
+        # Compared stocks keep their color while others are added or removed
+        used_colors = set(self.compare_colors.values())
+        return next((color for color in COMPARE_COLORS if color not in used_colors), None)
 
     def get_widget(self):
         return self.graph
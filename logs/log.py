@@ -1,4 +1,4 @@
-import pandas as pd
+from datetime import datetime
 
 SAVE_FILE = "log.txt"
 
@@ -11,7 +11,7 @@ def set_save_file(save_file: str):
 
 
 def log_message(message: str):
-    time_stamp = pd.Timestamp.now()
+    time_stamp = datetime.now()
     message = message.replace("\n", "")
     message = f"{time_stamp} - Log: {message}\n"
     print(message, end="")
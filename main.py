@@ -1,27 +1,25 @@
 import sys
 
-from graph.stock_graph import StockPredictionGraph, StockGraph
+import numpy
+
+from graph.sparkline import SparklineDelegate
+from graph.stock_graph import StockPredictionGraph
 from logs.log import log_message
-from stock_data.stocks import Stonks, Stock
+from stock_data.stocks import Stonks, Stock, MissingPricesError
 from user.user import User, Database, exists_user, load_user, create_user
 from actions.operation import Operation, OperationList, Action
 from PyQt5 import uic, QtWidgets, QtGui, QtCore
+from stock_data.stock_page import StockPage
+from stock_data.universe import DEFAULT_CHUNK_SIZE
+from table.stock_filter import StockFilter, get_page_mask
+from table.stock_table import StockTableColumn, StockTableModel, SPARKLINE_ROLE
+from worker.prediction import PredictionWorker
 from worker.table import StockTableItemWorker
 from enum import Enum
 from re import findall
 from math import isnan
 
 
-class StockTableColumn(Enum):
-    INFO = 0
-    ID = 1
-    NAME = 2
-    PRICE = 3
-    DIFF = 4
-    YIELD = 5
-    GRAPH = 6
-
-
 class TabNames(Enum):
     LOGIN = 0
     REGISTER = 1
@@ -31,6 +29,10 @@ class TabNames(Enum):
     PORTFOLIO = 5
 
 
+FILTER_DELAY = 150  # Milliseconds without input before the stock list is filtered
+PAGE_SIZE = DEFAULT_CHUNK_SIZE  # Stocks are loaded in the chunks their prices are stored in
+PREFETCH_PAGES = 1  # Pages of the universe loaded ahead of the ones the user asked for
+
 period_days = {
     "-": 0,
     "7 days": 7,
@@ -52,10 +54,11 @@ class MainWindow(QtWidgets.QMainWindow):
         uic.loadUi("main.ui", self)
 
         self.stocks = Stonks()
+        self.start_prediction_thread()
         self.start_stock_loader_thread()
         self.current_stock: Stock = None
+        self.detail_graph: StockPredictionGraph = None  # Created with the first shown stock
         self.current_user: User = None
-        self.set_stock_details(self.stocks.get_stock_names()[0])
         self.operation_list = OperationList()
 
         self.database = Database()
@@ -101,6 +104,40 @@ class MainWindow(QtWidgets.QMainWindow):
         self.loader_thread.start()
         log_message("Started loading stock details")
 
+    def start_prediction_thread(self):
+        self.prediction_thread = QtCore.QThread()
+
+        self.prediction_worker = PredictionWorker(self.stocks)
+        self.prediction_worker.moveToThread(self.prediction_thread)
+
+        self.prediction_thread.started.connect(self.prediction_worker.run)
+        self.prediction_worker.progress.connect(self.on_prediction_ready)
+
+        self.prediction_worker.finished.connect(self.prediction_thread.quit)
+        self.prediction_worker.finished.connect(self.prediction_worker.deleteLater)
+        self.prediction_thread.finished.connect(self.prediction_thread.deleteLater)
+
+        self.prediction_thread.start()
+
+    def on_prediction_ready(self, stock_name: str, period: int, prediction: list):
+        if len(prediction) == 0:
+            # Failed predictions are not requested again by redrawing
+            return
+        if self.current_stock is not None and self.current_stock.get_name() == stock_name:
+            self.set_detail_graph(self.current_stock)
+        if self.current_user is not None and stock_name in self.current_user.get_portfolio().get_stocks():
+            self.update_portfolio()
+
+    def closeEvent(self, event: QtGui.QCloseEvent):
+        self.prediction_worker.stop()
+        self.prediction_thread.quit()
+        self.prediction_thread.wait()
+        self.worker.stop()
+        self.loader_thread.quit()
+        self.loader_thread.wait()
+        self.stocks.forecast_cache.save()
+        super(MainWindow, self).closeEvent(event)
+
     def on_period_changed(self):
         self.set_detail_graph(self.current_stock)
 
@@ -113,60 +150,89 @@ class MainWindow(QtWidgets.QMainWindow):
             compare_options.item(x).text() for x in range(compare_options.count()) if compare_options.item(x).checkState()
         ]
 
+    def uncheck_compare_option(self, stock_name: str):
+        compare_options: QtWidgets.QListWidget = self.findChild(QtWidgets.QListWidget, "compareOptions")
+        for item in compare_options.findItems(stock_name, QtCore.Qt.MatchFlag.MatchExactly):
+            item.setCheckState(QtCore.Qt.CheckState.Unchecked)
+
     def set_detail_graph(self, stock):
+        if stock is None:
+            return
         # TODO: get list of compare graphs
         compare_graphs = self.get_selected_compare_stocks()
 
-        stock_graph = self.findChild(QtWidgets.QWidget, "historyGraphContainer")
         period_selection: QtWidgets.QComboBox = self.findChild(QtWidgets.QComboBox, "graphPeriodSelection")
         predict_selection: QtWidgets.QComboBox = self.findChild(QtWidgets.QComboBox, "graphPredictionSelection")
         period = period_days[period_selection.currentText()]
         predict_period = period_days[predict_selection.currentText()]
-        layout = stock_graph.layout()
-        if layout is not None:
-            # Clear layout
-            for i in reversed(range(layout.count())):
-                layout.itemAt(i).widget().setParent(None)
-        else:
+        if self.detail_graph is None:
+            self.detail_graph = StockPredictionGraph()
             layout = QtWidgets.QHBoxLayout()
-            stock_graph.setLayout(layout)
+            layout.addWidget(self.detail_graph.get_widget())
+            self.findChild(QtWidgets.QWidget, "historyGraphContainer").setLayout(layout)
 
-        compare_x = []
-        compare_y = []
+        compare_stocks = {}
         for stock_name in compare_graphs:
-            compare_stock = self.stocks.get_stock(stock_name)
-            compare_x.append(compare_stock.get_time_stamps(period))
-            compare_y.append(compare_stock.get_prices(period))
+            try:
+                compare_stock = self.stocks.get_stock(stock_name)
+            except MissingPricesError:
+                log_message(f"No price data to compare with {stock_name}")
+                self.uncheck_compare_option(stock_name)
+                continue
+            compare_stocks[stock_name] = (compare_stock.get_time_stamps(period), compare_stock.get_prices(period))
 
-        graph = StockPredictionGraph(stock.get_time_stamps(period), stock.get_prices(period),
-                                     stock.get_prediction(predict_period), compare_x, compare_y)
-        layout.addWidget(graph.get_widget())
+        prediction = stock.get_cached_prediction(predict_period)
+        if prediction is None:
+            # Shown without a prediction until the worker reports back. The longest selectable period is
+            # requested, every shorter selection is then served from the forecast cache
+            longest_period = max(period_days[predict_selection.itemText(i)] for i in range(predict_selection.count()))
+            self.prediction_worker.request(stock.get_name(), max(predict_period, longest_period))
+            prediction = []
+
+        self.detail_graph.set_data(stock.get_name(), stock.get_time_stamps(period), stock.get_prices(period),
+                                   prediction, compare_stocks)
 
     def update_portfolio(self):
+        portfolio_stocks = self.current_user.get_portfolio().get_stocks()
+        predictions = self.stocks.get_cached_predictions(list(portfolio_stocks.keys()), 365)
+        for stock_name, prediction in predictions.items():
+            if prediction is None:
+                self.prediction_worker.request(stock_name, 365)
+
         total_value = str(round(self.current_user.get_portfolio().get_current_value(self.stocks), 2)) + "€"
         self.findChild(QtWidgets.QLabel, "totalValue").setText(total_value)
-        total_predicted_value = str(round(self.current_user.get_portfolio().get_predicted_value(self.stocks), 2)) + "€"
+        total_predicted_value = str(round(
+            self.current_user.get_portfolio().get_predicted_value(self.stocks, predictions), 2)) + "€"
+        if None in predictions.values():
+            total_predicted_value += " (calculating...)"
         self.findChild(QtWidgets.QLabel, "predictedValue").setText(total_predicted_value)
 
-        portfolio_stocks = self.current_user.get_portfolio().get_stocks()
-
         table: QtWidgets.QTableWidget = self.findChild(QtWidgets.QTableWidget, "portfolioDetailsTable")
         table.setRowCount(0)
 
         row = 0
-        for stock_name in portfolio_stocks.keys():
-            stonk = self.stocks.get_stock(stock_name)
+        # Stocks without price data are not listed
+        for stonk in self.stocks.load_stocks(list(portfolio_stocks.keys()), load_meta_data=False):
+            stock_name = stonk.get_name()
             current_value = stonk.get_ask_price()
-            predicted_value = stonk.get_prediction(365)[-1]
-            if isnan(predicted_value):
-                log_message("prediction error: nan")
+            if predictions[stock_name] is None:
+                # Still being calculated
+                predicted_value = "..."
+                profit = "..."
+            elif len(predictions[stock_name]) == 0:
                 continue
-            log_message(f"predicted {stock_name} as {predicted_value} in 12 months")
-            profit = round(predicted_value / current_value * 100, 2)
-            if profit < 100:
-                profit = str((100 - profit) * -1)
             else:
-                profit = "+" + str(profit - 100)
+                predicted_value = predictions[stock_name][-1]
+                if isnan(predicted_value):
+                    log_message("prediction error: nan")
+                    continue
+                log_message(f"predicted {stock_name} as {predicted_value} in 12 months")
+                profit = round(predicted_value / current_value * 100, 2)
+                if profit < 100:
+                    profit = str((100 - profit) * -1)
+                else:
+                    profit = "+" + str(profit - 100)
+                predicted_value = str(round(predicted_value, 2))
 
             table.insertRow(row)
             self.set_table_cell_data(row, 1, 1, table, editable=True)
@@ -174,7 +240,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.set_table_cell_data(row, 3, stonk.get_long_name(), table)
             self.set_table_cell_data(row, 4, self.current_user.get_portfolio().get_holding(stock_name), table)
             self.set_table_cell_data(row, 5, current_value, table)
-            self.set_table_cell_data(row, 6, str(round(predicted_value, 2)), table)
+            self.set_table_cell_data(row, 6, predicted_value, table)
             self.set_table_cell_data(row, 7, profit, table)
 
             sell_button = QtWidgets.QPushButton("Sell")
@@ -210,50 +276,103 @@ class MainWindow(QtWidgets.QMainWindow):
             compare_options.item(x).setCheckState(False)
 
     def init_stock_table(self):
-        stock_table: QtWidgets.QTableWidget = self.findChild(QtWidgets.QTableWidget, "stockDetailTable")
+        stock_table: QtWidgets.QTableView = self.findChild(QtWidgets.QTableView, "stockDetailTable")
+        self.stock_table_model = StockTableModel(stock_table)
+        stock_table.setModel(self.stock_table_model)
+        stock_table.setItemDelegateForColumn(StockTableColumn.GRAPH.value,
+                                             SparklineDelegate(SPARKLINE_ROLE, stock_table))
         stock_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
-        stock_table.verticalHeader().setDefaultSectionSize(120)
+        stock_table.verticalHeader().setDefaultSectionSize(60)
+        stock_table.clicked.connect(self.on_stock_table_clicked)
+
+        # Rapid input only filters once
+        self.filter_timer = QtCore.QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY)
+        self.filter_timer.timeout.connect(self.apply_stock_filter)
+
+        # Pages over the filtered stocks, the universe is loaded one page at a time. Further pages are only
+        # loaded when the user asks for the next page, a filter may leave the last page partly filled
+        self.stock_page = StockPage([], PAGE_SIZE)
+        self.universe_page = StockPage(self.stocks.get_stock_names(), PAGE_SIZE)
+        self.requested_pages = 0
+        self.wanted_pages = 1 + PREFETCH_PAGES
+        self.loading_stock_names = None
+        self.stock_table_model.layoutChanged.connect(lambda: self.update_stock_page(reset_page=False))
+        stock_table.setSortingEnabled(True)
+        self.request_stock_pages()
 
     def on_stock_table_load_finished(self):
         info_label: QtWidgets.QLabel = self.findChild(QtWidgets.QLabel, "stockTableLoadingIndicator")
         info_label.setText("")
-        self.findChild(QtWidgets.QTableWidget, "stockDetailTable").setSortingEnabled(True)
         log_message("Finished loading stock details")
 
-    def stock_table_append(self, stock: Stock):
-        stock_table: QtWidgets.QTableWidget = self.findChild(QtWidgets.QTableWidget, "stockDetailTable")
+    def has_unloaded_pages(self) -> bool:
+        return self.requested_pages <= self.universe_page.get_max_pages()
+
+    def request_stock_pages(self) -> bool:
+        # Loads the next page of the universe until the page after the current one is filled or the wanted
+        # pages are loaded. Returns whether a page is being loaded
+        if self.loading_stock_names is not None:
+            return True
+        if not self.has_unloaded_pages() or self.requested_pages >= self.wanted_pages or \
+                len(self.stock_page.stock_names) >= (self.stock_page.get_page_index() + 2) * PAGE_SIZE:
+            return False
+        self.loading_stock_names = self.universe_page.get_page_by_index(self.requested_pages)
+        self.requested_pages += 1
+        self.findChild(QtWidgets.QLabel, "stockTableLoadingIndicator").setText("Loading...")
+        self.worker.request(self.loading_stock_names)
+        return True
+
+    def stock_table_append(self, stock_names: list, stocks: list):
         price_filter_min = self.findChild(QtWidgets.QSlider, "stockPriceFilter")
         price_filter_max = self.findChild(QtWidgets.QSlider, "stockPriceFilter2")
 
-        if stock.get_ask_price() > price_filter_min.maximum():
-            new_max = int(stock.get_ask_price()) + 2
+        max_price = max((stock.get_ask_price() for stock in stocks), default=0)
+        if max_price > price_filter_min.maximum():
+            new_max = int(max_price) + 2
             price_filter_min.setMaximum(new_max)
             price_filter_max.setMaximum(new_max)
 
-        stock_trend = stock.get_stock_trend(28)
-        stock_graph = StockGraph(stock.get_time_stamps(28), stock.get_prices(28))
-        sign = "+" if stock_trend > 0 else ""
-        icon = QtGui.QIcon("assets/info_logo.png")
-        info_widget = QtWidgets.QPushButton()
-        info_widget.setIcon(icon)
-        info_widget.clicked.connect(self.show_stock_info)
-
-        i = stock_table.rowCount()
-        stock_table.insertRow(i)
-
-        stock_table.setCellWidget(i, StockTableColumn.INFO.value, info_widget)
-        self.set_table_cell_data(i, StockTableColumn.ID.value, stock.get_name())
-        self.set_table_cell_data(i, StockTableColumn.NAME.value, stock.get_long_name())
-        self.set_table_cell_data(i, StockTableColumn.PRICE.value, stock.get_ask_price())
-        self.set_table_cell_data(i, StockTableColumn.DIFF.value, f"{sign}{'{:4.2f}'.format(stock_trend)}%")
-        stock_table.setCellWidget(i, StockTableColumn.GRAPH.value, stock_graph.get_widget())
-        self.set_table_cell_data(i, StockTableColumn.YIELD.value, round(stock.get_dividend_yield() * 100, 4))
-
-        self.on_search_changed()
-
-    def set_table_cell_data(self, row, col, value, widget: QtWidgets.QTableWidget=None, editable=False):
-        if not widget:
-            widget = self.findChild(QtWidgets.QTableWidget, "stockDetailTable")
+        self.stock_table_model.append_stocks(stocks)
+        if self.current_stock is None and len(stocks) > 0:
+            # The window is shown before any prices are loaded, the first loaded stock fills the details
+            self.set_stock_details(stocks[0].get_name())
+        if stock_names == self.loading_stock_names:
+            self.loading_stock_names = None
+        self.update_stock_page(reset_page=False)
+        if self.loading_stock_names is None:
+            self.on_stock_table_load_finished()
+
+    def update_stock_page(self, reset_page: bool = True):
+        # Only rows whose visibility changed are touched
+        filter_index = self.stock_table_model.filter_index
+        mask = filter_index.update_mask(self.get_stock_filter())
+        self.stock_page.update_stock_names([self.stock_table_model.get_stock_name(row)
+                                            for row in numpy.flatnonzero(mask)], reset_page)
+        page_mask = get_page_mask(mask, self.stock_page.get_page_index(), self.stock_page.get_page_size())
+        stock_table: QtWidgets.QTableView = self.findChild(QtWidgets.QTableView, "stockDetailTable")
+        for row in filter_index.update_visible(page_mask):
+            stock_table.setRowHidden(row, not page_mask[row])
+
+        self.request_stock_pages()
+        page_index = self.stock_page.get_page_index()
+        max_pages = max(0, self.stock_page.get_max_pages())
+        more = "+" if self.has_unloaded_pages() else ""
+        self.findChild(QtWidgets.QLabel, "pageNumberLabel").setText(f"Page {page_index + 1} / {max_pages + 1}{more}")
+        self.set_page_button_state(page_index > 0, page_index < max_pages or self.has_unloaded_pages())
+
+    def on_previous_page(self):
+        self.stock_page.previous_page()
+        self.update_stock_page(reset_page=False)
+
+    def on_next_page(self):
+        # Stays on the last page while it is partly filled, one more page of the universe is loaded per click
+        self.wanted_pages = max(self.wanted_pages, self.requested_pages) + 1
+        self.stock_page.next_page()
+        self.update_stock_page(reset_page=False)
+
+    def set_table_cell_data(self, row, col, value, widget: QtWidgets.QTableWidget, editable=False):
         item = widget.item(row, col)
         if not item:
             item = QtWidgets.QTableWidgetItem()
@@ -262,19 +381,12 @@ class MainWindow(QtWidgets.QMainWindow):
         if not editable:
             item.setFlags(QtCore.Qt.ItemIsEnabled)
 
-    def get_table_cell_data(self, row, col):
-        stock_table: QtWidgets.QTableWidget = self.findChild(QtWidgets.QTableWidget, "stockDetailTable")
-        item = stock_table.item(row, col)
-        if not item:
-            return ""
-        return item.data(QtCore.Qt.ItemDataRole.DisplayRole)
-
-    def show_stock_info(self):
-        table: QtWidgets.QTableWidget = self.findChild(QtWidgets.QTableWidget, "stockDetailTable")
-        row = table.currentRow()
+    def on_stock_table_clicked(self, index: QtCore.QModelIndex):
+        if index.column() == StockTableColumn.INFO.value:
+            self.show_stock_info(index.row())
 
-        stock_id = self.get_table_cell_data(row, StockTableColumn.ID.value)
-        self.set_stock_details(stock_id)
+    def show_stock_info(self, row: int):
+        self.set_stock_details(self.stock_table_model.get_stock_name(row))
 
         tab_widget = self.findChild(QtWidgets.QTabWidget, "tabWidget")
         tab_widget.setCurrentIndex(TabNames.STOCK_DETAILS.value)
@@ -294,6 +406,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.current_user.save_user()
 
     def buy_stock(self):
+        if self.current_stock is None:
+            return
         if self.current_user is not None:
             stock_price = self.current_stock.get_ask_price()
             balance = self.current_user.get_balance_euros()
@@ -375,14 +489,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.findChild(QtWidgets.QComboBox, "graphPredictionSelection").currentIndexChanged.connect(
             self.on_prediction_period_changed)
         self.findChild(QtWidgets.QPushButton, "buyStockButton").clicked.connect(self.buy_stock)
+        self.findChild(QtWidgets.QPushButton, "stockTablePrevPage").clicked.connect(self.on_previous_page)
+        self.findChild(QtWidgets.QPushButton, "stockTableNextPage").clicked.connect(self.on_next_page)
         self.findChild(QtWidgets.QListWidget, "compareOptions").itemClicked.connect(
             lambda: self.set_detail_graph(self.current_stock))
 
-    def set_page_button_state(self, state: bool):
-        prev = self.findChild(QtWidgets.QPushButton, "stockTablePrevPage")
-        next = self.findChild(QtWidgets.QPushButton, "stockTableNextPage")
-        prev.setEnabled(state)
-        next.setEnabled(state)
+    def set_page_button_state(self, previous_state: bool, next_state: bool):
+        self.findChild(QtWidgets.QPushButton, "stockTablePrevPage").setEnabled(previous_state)
+        self.findChild(QtWidgets.QPushButton, "stockTableNextPage").setEnabled(next_state)
 
     def on_exit(self):
         self.close()
@@ -517,12 +631,8 @@ class MainWindow(QtWidgets.QMainWindow):
         tab_widget.setStyleSheet(tab_widget.styleSheet())
 
     def on_search_changed(self):
-        search = self.findChild(QtWidgets.QLineEdit, "stockNameSearch").text()
         value_lower = self.findChild(QtWidgets.QSlider, "stockPriceFilter").value()
         value_upper = self.findChild(QtWidgets.QSlider, "stockPriceFilter2").value()
-        positive_check = self.findChild(QtWidgets.QCheckBox, "positiveTrendsCheck").isChecked()
-        negative_check = self.findChild(QtWidgets.QCheckBox, "negativeTrendsCheck").isChecked()
-        yield_slider_value = self.findChild(QtWidgets.QSlider, "stockYieldFilter").value()
 
         if value_lower > value_upper:
             slider = self.findChild(QtWidgets.QSlider, "stockPriceFilter2")
@@ -533,18 +643,21 @@ class MainWindow(QtWidgets.QMainWindow):
             slider.setValue(value_upper - 1)
             value_lower -= 1
 
-        stock_table: QtWidgets.QTableWidget = self.findChild(QtWidgets.QTableWidget, "stockDetailTable")
-        for i in range(stock_table.rowCount()):
-            name = str(self.get_table_cell_data(i, StockTableColumn.NAME.value))
-            price = self.get_table_cell_data(i, StockTableColumn.PRICE.value)
-            diff = self.get_table_cell_data(i, StockTableColumn.DIFF.value)
-            stock_yield = self.get_table_cell_data(i, StockTableColumn.YIELD.value)
-            if search.lower() not in name.lower() or price < value_lower or price > value_upper or \
-                    ("+" in diff and not positive_check) or (
-                    "-" in diff and not negative_check) or stock_yield < yield_slider_value:
-                stock_table.hideRow(i)
-            else:
-                stock_table.showRow(i)
+        self.filter_timer.start()
+
+    def get_stock_filter(self) -> StockFilter:
+        return StockFilter(
+            self.findChild(QtWidgets.QLineEdit, "stockNameSearch").text(),
+            self.findChild(QtWidgets.QSlider, "stockPriceFilter").value(),
+            self.findChild(QtWidgets.QSlider, "stockPriceFilter2").value(),
+            self.findChild(QtWidgets.QCheckBox, "positiveTrendsCheck").isChecked(),
+            self.findChild(QtWidgets.QCheckBox, "negativeTrendsCheck").isChecked(),
+            self.findChild(QtWidgets.QSlider, "stockYieldFilter").value()
+        )
+
+    def apply_stock_filter(self):
+        # A new filter starts on its first page
+        self.update_stock_page(reset_page=True)
 
     def set_icons(self):
         self.setWindowIcon(QtGui.QIcon("assets/logo.png"))
@@ -1,39 +1,53 @@
-import math
 import random
-from typing import List, Tuple
+from typing import List, Tuple, Union
 
-from util.util import fix_results
+import numpy
+from numpy.lib.stride_tricks import sliding_window_view
 
+from util.util import fill_invalid
 
-def remove_nan(ticker_data: List[float]) -> List[float]:
-    new_data = []
-    add = False
-    for value in ticker_data:
-        if value is not math.nan:
-            add = True
-        if add:
-            new_data.append(value)
-    return new_data
 
+def remove_nan(ticker_data: Union[List[float], numpy.ndarray]) -> numpy.ndarray:
+    # Drop the leading gap before the first valid price
+    ticker_data = numpy.asarray(ticker_data, dtype=numpy.float64)
+    valid = ~numpy.isnan(ticker_data)
+    if not valid.any():
+        return ticker_data[:0]
+    return ticker_data[numpy.argmax(valid):]
 
-def get_training_data(ticker_data: List[float], input_period: int, scale_values: bool = True):
+
+def create_noise() -> float:
+    return random.random() * 0.4 + 0.8  # We add a tiny bit of noise to counter patterns in the predictions
+
+
+def scale_data(ticker_data: numpy.ndarray, scaling_factor: float, noise: float) -> numpy.ndarray:
+    ticker_data = ticker_data * (noise / scaling_factor)  # Normalize values for more efficient and accurate training
+    return fill_invalid(ticker_data)
+
+
+def get_training_data(ticker_data: Union[List[float], numpy.ndarray], input_period: int,
+                      scale_values: bool = True, output_period: int = 1,
+                      noise: float = None) -> Tuple[numpy.ndarray, numpy.ndarray, float]:
     ticker_data = remove_nan(ticker_data)
-    x = []
-    y = []
-    scaling_factor = max(ticker_data)
+    if len(ticker_data) < input_period + output_period:
+        y_shape = (0,) if output_period == 1 else (0, output_period)
+        return numpy.empty((0, input_period), dtype=numpy.float32), numpy.empty(y_shape, dtype=numpy.float32), 1.0
+
+    scaling_factor = float(numpy.nanmax(ticker_data))
     if scale_values:
-        noise = (random.random() * 0.4 + 0.8)  # We add a tiny bit of noise to counter patterns in the predictions
-        ticker_data = [((element * noise) / scaling_factor) for element in
-                       ticker_data]  # Normalize values for more efficient and accurate training
-        ticker_data = fix_results(ticker_data)
-
-    for i in range(len(ticker_data)):
-        if i < input_period:
-            i = input_period
-        training_data = []
-        for time in range(input_period):
-            training_data.append(ticker_data[i - input_period - time])
-        x.append(training_data)
-        y.append(ticker_data[i])
+        ticker_data = scale_data(ticker_data, scaling_factor, create_noise() if noise is None else noise)
 
+    x, y = create_windows(ticker_data, input_period, output_period)
     return x, y, scaling_factor
+
+
+def create_windows(ticker_data: numpy.ndarray, input_period: int,
+                   output_period: int = 1) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    # Every window holds input_period days followed by the output_period days to predict
+    if len(ticker_data) < input_period + output_period:
+        y_shape = (0,) if output_period == 1 else (0, output_period)
+        return numpy.empty((0, input_period), dtype=numpy.float32), numpy.empty(y_shape, dtype=numpy.float32)
+    windows = sliding_window_view(ticker_data.astype(numpy.float32), input_period + output_period)
+    x = numpy.ascontiguousarray(windows[:, :input_period])
+    y = numpy.ascontiguousarray(windows[:, input_period] if output_period == 1 else windows[:, input_period:])
+    return x, y
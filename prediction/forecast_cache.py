@@ -0,0 +1,86 @@
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+
+from logs.log import log_message
+
+DEFAULT_FORECAST_CACHE_FILE = "forecasts.json"
+DEFAULT_CAPACITY = 512
+
+
+class ForecastCache:
+    # Holds the longest forecast of every stock, a forecast is only valid for the model version and the
+    # last price bar it was made from
+
+    def __init__(self, file: str = None, capacity: int = DEFAULT_CAPACITY):
+        self.file = file
+        self.capacity = capacity
+        # Mapping of [StockName: str, (ModelVersion: str, LastTimeStamp: str, Forecast: list)], least recently
+        # used first
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.changed = False
+        if self.file is not None:
+            self.load()
+
+    def load(self):
+        if not os.path.exists(self.file):
+            return
+        try:
+            with open(self.file, "r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError) as exception:
+            log_message(f"Could not load forecast cache: {exception}")
+            return
+        with self.lock:
+            for stock_name, (version, last_time_stamp, forecast) in entries.items():
+                self.entries[stock_name] = (version, last_time_stamp, forecast)
+            self._evict()
+
+    def save(self):
+        if self.file is None:
+            return
+        with self.lock:
+            if not self.changed:
+                return
+            entries = {stock_name: list(entry) for stock_name, entry in self.entries.items()}
+            self.changed = False
+        with open(f"{self.file}.tmp", "w") as file:
+            json.dump(entries, file)
+        os.replace(f"{self.file}.tmp", self.file)
+
+    def get(self, stock_name: str, version: str, last_time_stamp: str, period: int) -> Optional[List[float]]:
+        # Any shorter period is served as a prefix of the cached forecast
+        with self.lock:
+            entry = self.entries.get(stock_name)
+            if entry is None or entry[0] != version or entry[1] != last_time_stamp or len(entry[2]) < period:
+                return None
+            self.entries.move_to_end(stock_name)
+            return entry[2][:period]
+
+    def put(self, stock_name: str, version: str, last_time_stamp: str, forecast: List[float]) -> List[float]:
+        # Returns the stored forecast, days that were already forecast are kept so that shorter periods stay a
+        # prefix of longer ones
+        with self.lock:
+            entry = self.entries.get(stock_name)
+            if entry is not None and entry[0] == version and entry[1] == last_time_stamp:
+                if len(entry[2]) >= len(forecast):
+                    self.entries.move_to_end(stock_name)
+                    return entry[2]
+                forecast = entry[2] + forecast[len(entry[2]):]
+            self.entries[stock_name] = (version, last_time_stamp, forecast)
+            self.entries.move_to_end(stock_name)
+            self.changed = True
+            self._evict()
+            return forecast
+
+    def _evict(self):
+        # Requires self.lock
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.changed = True
+
+    def __len__(self):
+        return len(self.entries)
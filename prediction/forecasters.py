@@ -0,0 +1,223 @@
+from typing import Dict, List, Optional
+
+import numpy
+from numpy.lib.stride_tricks import sliding_window_view
+
+from prediction.data import remove_nan
+from prediction.forecast_cache import ForecastCache
+from util.util import fill_invalid, fix_results
+
+NETWORK_FORECASTER = "network"
+DEFAULT_FORECASTER = NETWORK_FORECASTER
+FORECASTER_VARIABLE = "STONKS_FORECASTER"  # Environment variable choosing the forecaster of a deployment
+DEFAULT_FIT_PERIOD = 365
+MIN_HISTORY = 2
+
+
+def get_last_time_stamp(stock) -> str:
+    return str(stock.get_time_stamps()[-1])
+
+
+class Forecaster:
+    # Common interface of all prediction algorithms, forecasts are served from the forecast cache when possible
+    version: str = None  # Forecasts are only reused for the same version
+
+    def __init__(self, forecast_cache: ForecastCache = None):
+        self.stock_names: List[str] = []
+        self.forecast_cache = ForecastCache() if forecast_cache is None else forecast_cache
+        self.last_time_stamps: Dict[str, str] = {}  # Last price bar of every stock that can be forecast
+        self.ready = False
+
+    def add_stock(self, stock):
+        raise NotImplementedError
+
+    def _forecast(self, stock_names: List[str], period: int) -> numpy.ndarray:
+        # Returns one row of period prices per stock
+        raise NotImplementedError
+
+    def get_cached_prediction(self, stock_name: str, period: int) -> Optional[List[float]]:
+        # Never computes anything, safe to call from the GUI thread
+        if not self.ready or stock_name not in self.last_time_stamps:
+            return None
+        return self.forecast_cache.get(stock_name, self.version, self.last_time_stamps[stock_name], period)
+
+    def predict_future_stocks_prices(self, stock_names: List[str], period: int = 28) -> Dict[str, List[float]]:
+        if self.version is None:
+            return {stock_name: [] for stock_name in stock_names}
+
+        predictions = {}
+        missing = []
+        for stock_name in stock_names:
+            if stock_name not in self.last_time_stamps:
+                predictions[stock_name] = []
+                continue
+            cached = self.forecast_cache.get(stock_name, self.version, self.last_time_stamps[stock_name], period)
+            if cached is None:
+                missing.append(stock_name)
+            else:
+                predictions[stock_name] = cached
+
+        if len(missing) > 0:
+            for stock_name, result in zip(missing, self._forecast(missing, period)):
+                result = self.forecast_cache.put(stock_name, self.version, self.last_time_stamps[stock_name],
+                                                 fix_results(result.tolist()))
+                predictions[stock_name] = result[:period]
+        return predictions
+
+    def predict_future_stock_prices(self, period: int = 28, stock_name: str = None) -> List[float]:
+        if stock_name is None:
+            stock_name = self.stock_names[-1]
+        return self.predict_future_stocks_prices([stock_name], period)[stock_name]
+
+    def is_ready(self):
+        return self.ready
+
+
+class StatisticalForecaster(Forecaster):
+    # Fits the model of every requested stock at once on a matrix of the last fit_period prices, one row per stock
+    name: str = None
+
+    def __init__(self, stocks: List = None, fit_period: int = DEFAULT_FIT_PERIOD,
+                 forecast_cache: ForecastCache = None):
+        super(StatisticalForecaster, self).__init__(forecast_cache)
+        self.fit_period = fit_period
+        self.histories: Dict[str, numpy.ndarray] = {}
+        self.version = self.get_version()
+        for stock in [] if stocks is None else stocks:
+            self.add_stock(stock)
+        self.ready = True
+
+    def get_version(self) -> str:
+        return f"{self.name}-{self.fit_period}"
+
+    def add_stock(self, stock):
+        if stock.get_name() in self.histories:
+            return
+        history = remove_nan(stock.get_prices())[-self.fit_period:]
+        if len(history) < MIN_HISTORY:
+            return
+        self.stock_names.append(stock.get_name())
+        self.histories[stock.get_name()] = fill_invalid(history)
+        self.last_time_stamps[stock.get_name()] = get_last_time_stamp(stock)
+
+    def get_price_matrix(self, stock_names: List[str]):
+        # Histories are aligned to the last bar, shorter ones are padded with their first price
+        lengths = numpy.array([len(self.histories[stock_name]) for stock_name in stock_names])
+        prices = numpy.empty((len(stock_names), lengths.max()))
+        for row, stock_name in enumerate(stock_names):
+            history = self.histories[stock_name]
+            prices[row, :prices.shape[1] - len(history)] = history[0]
+            prices[row, prices.shape[1] - len(history):] = history
+        valid = numpy.arange(prices.shape[1]) >= (prices.shape[1] - lengths)[:, numpy.newaxis]
+        return prices, valid
+
+    def _forecast(self, stock_names: List[str], period: int) -> numpy.ndarray:
+        prices, valid = self.get_price_matrix(stock_names)
+        return self.fit_predict(prices, valid, period)
+
+    def fit_predict(self, prices: numpy.ndarray, valid: numpy.ndarray, period: int) -> numpy.ndarray:
+        raise NotImplementedError
+
+
+class DriftForecaster(StatisticalForecaster):
+    # Extends the line from the first to the last price
+    name = "drift"
+
+    def fit_predict(self, prices: numpy.ndarray, valid: numpy.ndarray, period: int) -> numpy.ndarray:
+        lengths = valid.sum(axis=1)
+        first = prices[numpy.arange(len(prices)), prices.shape[1] - lengths]
+        slopes = (prices[:, -1] - first) / numpy.maximum(lengths - 1, 1)
+        return prices[:, -1:] + slopes[:, numpy.newaxis] * numpy.arange(1, period + 1)
+
+
+class ExponentialSmoothingForecaster(StatisticalForecaster):
+    # Simple exponential smoothing, the forecast stays at the smoothed level
+    name = "smoothing"
+
+    def __init__(self, stocks: List = None, fit_period: int = DEFAULT_FIT_PERIOD,
+                 forecast_cache: ForecastCache = None, alpha: float = 0.3):
+        self.alpha = alpha
+        super(ExponentialSmoothingForecaster, self).__init__(stocks, fit_period, forecast_cache)
+
+    def get_version(self) -> str:
+        return f"{self.name}-{self.fit_period}-{self.alpha}"
+
+    def fit_predict(self, prices: numpy.ndarray, valid: numpy.ndarray, period: int) -> numpy.ndarray:
+        # The recursion unrolled into one weight per day, the padding keeps the level at the first price
+        weights = self.alpha * (1 - self.alpha) ** numpy.arange(prices.shape[1] - 1, -1, -1)
+        weights[0] = (1 - self.alpha) ** (prices.shape[1] - 1)
+        levels = prices @ weights
+        return numpy.repeat(levels[:, numpy.newaxis], period, axis=1)
+
+
+class LinearTrendForecaster(StatisticalForecaster):
+    # Least squares line through the history of every stock
+    name = "trend"
+
+    def fit_predict(self, prices: numpy.ndarray, valid: numpy.ndarray, period: int) -> numpy.ndarray:
+        days = numpy.arange(prices.shape[1], dtype=numpy.float64)
+        lengths = valid.sum(axis=1)
+        mean_days = (valid @ days) / lengths
+        mean_prices = (prices * valid).sum(axis=1) / lengths
+        centered_days = (days - mean_days[:, numpy.newaxis]) * valid
+        variances = (centered_days ** 2).sum(axis=1)
+        covariances = (centered_days * (prices - mean_prices[:, numpy.newaxis])).sum(axis=1)
+        slopes = covariances / numpy.maximum(variances, 1e-12)
+        future_days = numpy.arange(prices.shape[1], prices.shape[1] + period) - mean_days[:, numpy.newaxis]
+        return mean_prices[:, numpy.newaxis] + slopes[:, numpy.newaxis] * future_days
+
+
+class AutoRegressiveForecaster(StatisticalForecaster):
+    # AR(p) with intercept on the daily price changes, all stocks are solved in one batched least squares call
+    name = "ar"
+
+    def __init__(self, stocks: List = None, fit_period: int = DEFAULT_FIT_PERIOD,
+                 forecast_cache: ForecastCache = None, order: int = 5, ridge: float = 1e-6):
+        self.order = order
+        self.ridge = ridge  # Keeps the normal equations solvable for short or flat histories
+        super(AutoRegressiveForecaster, self).__init__(stocks, fit_period, forecast_cache)
+
+    def get_version(self) -> str:
+        return f"{self.name}{self.order}-{self.fit_period}"
+
+    def fit_predict(self, prices: numpy.ndarray, valid: numpy.ndarray, period: int) -> numpy.ndarray:
+        changes = numpy.diff(prices, axis=1)
+        changes_valid = valid[:, 1:] & valid[:, :-1]
+        if changes.shape[1] <= self.order:
+            return numpy.repeat(prices[:, -1:], period, axis=1)
+
+        # Every sample holds the order previous changes followed by the change to explain
+        samples = sliding_window_view(changes, self.order + 1, axis=1)
+        samples_valid = sliding_window_view(changes_valid, self.order + 1, axis=1).all(axis=2).astype(numpy.float64)
+        design = numpy.concatenate([numpy.ones(samples.shape[:2] + (1,)), samples[:, :, :-1]], axis=2)
+        targets = samples[:, :, -1]
+
+        normal_matrices = numpy.einsum("nsp,ns,nsq->npq", design, samples_valid, design)
+        normal_vectors = numpy.einsum("nsp,ns,ns->np", design, samples_valid, targets)
+        regularization = self.ridge * numpy.trace(normal_matrices, axis1=1, axis2=2) / (self.order + 1) + 1e-12
+        normal_matrices += regularization[:, numpy.newaxis, numpy.newaxis] * numpy.eye(self.order + 1)
+        coefficients = numpy.linalg.solve(normal_matrices, normal_vectors[:, :, numpy.newaxis])[:, :, 0]
+
+        # Roll the changes forward, the oldest lag comes first as in the design matrix
+        lags = changes[:, -self.order:].copy()
+        future_changes = numpy.empty((len(prices), period))
+        for day in range(period):
+            future_changes[:, day] = coefficients[:, 0] + (coefficients[:, 1:] * lags).sum(axis=1)
+            lags[:, :-1] = lags[:, 1:]
+            lags[:, -1] = future_changes[:, day]
+        return prices[:, -1:] + numpy.cumsum(future_changes, axis=1)
+
+
+FORECASTERS = {
+    DriftForecaster.name: DriftForecaster,
+    ExponentialSmoothingForecaster.name: ExponentialSmoothingForecaster,
+    LinearTrendForecaster.name: LinearTrendForecaster,
+    AutoRegressiveForecaster.name: AutoRegressiveForecaster
+}
+
+
+def create_forecaster(name: str, stocks: List = None, forecast_cache: ForecastCache = None,
+                      **parameters) -> StatisticalForecaster:
+    if name not in FORECASTERS:
+        raise ValueError(f"Unknown forecaster {name}, expected one of {[NETWORK_FORECASTER] + list(FORECASTERS)}")
+    return FORECASTERS[name](stocks, forecast_cache=forecast_cache, **parameters)
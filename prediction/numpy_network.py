@@ -0,0 +1,36 @@
+from typing import List
+
+import numpy
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "tanh": numpy.tanh,
+    "relu": lambda x: numpy.maximum(x, 0)
+}
+
+
+class NumpyNetwork:
+    # Inference of a stack of Dense layers with plain matrix products, no TensorFlow required
+
+    def __init__(self, weights: List[numpy.ndarray], activations: List[str]):
+        if len(weights) != 2 * len(activations):
+            raise ValueError(f"Expected kernel and bias for {len(activations)} layers, got {len(weights)} arrays")
+        self.layers = [(numpy.asarray(weights[2 * i], dtype=numpy.float32),
+                        numpy.asarray(weights[2 * i + 1], dtype=numpy.float32),
+                        ACTIVATIONS[activation]) for i, activation in enumerate(activations)]
+
+    def __call__(self, x: numpy.ndarray) -> numpy.ndarray:
+        # x holds one input window per row, all rows are evaluated at once
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+    def get_weights(self) -> List[numpy.ndarray]:
+        weights = []
+        for kernel, bias, _ in self.layers:
+            weights.extend([kernel, bias])
+        return weights
+
+    @staticmethod
+    def from_model(model, activations: List[str]) -> "NumpyNetwork":
+        return NumpyNetwork(model.get_weights(), activations)
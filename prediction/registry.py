@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy
+
+from logs.log import log_message
+from util.util import encode_file_name
+
+DEFAULT_REGISTRY_DIRECTORY = "models"
+
+
+def create_fingerprint(prices: List[numpy.ndarray]) -> str:
+    # Changes whenever a bar is added or an existing bar is corrected
+    fingerprint = hashlib.sha256()
+    for stock_prices in prices:
+        fingerprint.update(numpy.ascontiguousarray(stock_prices, dtype=numpy.float64).tobytes())
+    return fingerprint.hexdigest()
+
+
+def create_model_key(stock_names: List[str], input_period: int, architecture: str) -> str:
+    if len(stock_names) == 1:
+        name = encode_file_name(stock_names[0])
+    else:
+        name = hashlib.sha256(" ".join(stock_names).encode("utf-8")).hexdigest()[:16]
+    return f"{name}_{input_period}_{architecture}"
+
+
+class ModelRegistry:
+
+    def __init__(self, directory: str = DEFAULT_REGISTRY_DIRECTORY):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_files(self, key: str) -> Tuple[str, str]:
+        path = os.path.join(self.directory, key)
+        return f"{path}.json", f"{path}.npz"
+
+    def has_model(self, key: str) -> bool:
+        return all(os.path.exists(file) for file in self.get_files(key))
+
+    def load(self, key: str) -> Tuple[Optional[dict], Optional[List[numpy.ndarray]]]:
+        if not self.has_model(key):
+            return None, None
+        meta_file, weights_file = self.get_files(key)
+        try:
+            with open(meta_file, "r") as file:
+                meta = json.load(file)
+            with numpy.load(weights_file) as weights:
+                return meta, [weights[f"arr_{i}"] for i in range(len(weights.files))]
+        except (OSError, ValueError, KeyError) as exception:
+            log_message(f"Could not load model {key}: {exception}")
+            return None, None
+
+    def save(self, key: str, meta: dict, weights: List[numpy.ndarray]):
+        meta_file, weights_file = self.get_files(key)
+        # Weights first, the meta file marks the model as complete
+        with open(f"{weights_file}.tmp", "wb") as file:
+            numpy.savez(file, *weights)
+        os.replace(f"{weights_file}.tmp", weights_file)
+        with open(f"{meta_file}.tmp", "w") as file:
+            json.dump(meta, file)
+        os.replace(f"{meta_file}.tmp", meta_file)
+        log_message(f"Saved model {key}")
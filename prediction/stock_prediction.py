@@ -1,46 +1,189 @@
-from typing import List, Union
+from typing import Dict, List, Union
 
 from threading import Thread
 
 import numpy as np
-from keras import Sequential
-from keras.layers import Dense
-from keras.optimizers import Adam
 
-from prediction.data import get_training_data
-from util.util import fix_results
+from logs.log import log_message
+from prediction.data import get_training_data, create_noise, create_windows, remove_nan, scale_data
+from prediction.forecast_cache import ForecastCache
+from prediction.forecasters import Forecaster, get_last_time_stamp
+from prediction.numpy_network import NumpyNetwork
+from prediction.registry import ModelRegistry, create_fingerprint, create_model_key
+from prediction.update_policy import UpdatePolicy
 
+ARCHITECTURE = "dense128tanh"
+NETWORK_ACTIVATIONS = ["linear", "tanh", "relu"]  # Must match the layers of _create_network
+TRAINING_EPOCHS = 10
 
-class StockPrediction:
-    model: Sequential = None
+
+class StockPrediction(Forecaster):
+    model = None  # Keras model, only created for training
+    network: NumpyNetwork = None  # Used for all predictions
 
     def __init__(self, stocks: Union[object, List], days_input_period: int = 28, scale_values: bool = True,
-                 threading: bool = False, verbose: int = 0):
+                 threading: bool = False, verbose: int = 0, days_output_period: int = 1,
+                 registry: ModelRegistry = None, forecast_cache: ForecastCache = None,
+                 update_policy: UpdatePolicy = None):
+        super(StockPrediction, self).__init__(forecast_cache)
         if not isinstance(stocks, list):
             stocks = [stocks]
         self.period = days_input_period
-        self.cache = []
+        self.output_period = days_output_period  # > 1 predicts several days per model call
+        self.stock_names = [stock.get_name() for stock in stocks]
+        self.registry = registry
+        self.update_policy = UpdatePolicy() if update_policy is None else update_policy
+        self.scale_values = scale_values
+        self.noise = 1.0
+        self.scaling_factors: Dict[str, float] = {}  # Every stock is normalized by its own factor
+        self.windows: Dict[str, np.ndarray] = {}  # Last known input period of every stock
         self.x = []
         self.y = []
-        self.ready = False
         if threading:
-            self.thread = Thread(target=self._create_model, args=(stocks, scale_values))
+            self.thread = Thread(target=self._create_model, args=(stocks, scale_values, verbose))
             self.thread.start()
         else:
             self._create_model(stocks, scale_values, verbose)
 
     def _create_model(self, stocks: List, scale_values: bool = True, verbose: int = 0):
-        if self.model is None:
-            self.x = []
-            self.y = []
-            for stock in stocks:
-                x, y, self.scaling_factor = get_training_data(stock.get_prices(), self.period, scale_values)
-                self.x.extend(x)
-                self.y.extend(y)
+        self._build_model(stocks, scale_values, verbose)
+        if self.network is not None:
+            self.version = create_fingerprint(self.network.get_weights())
+        self.ready = True
+
+    def _build_model(self, stocks: List, scale_values: bool = True, verbose: int = 0):
+        if self.network is None:
+            prices = [stock.get_prices() for stock in stocks]
+            key = create_model_key(self.stock_names, self.period, self.get_architecture())
+            fingerprint = create_fingerprint(prices)
+            meta, weights = (None, None) if self.registry is None else self.registry.load(key)
+            if meta is not None:
+                if meta["fingerprint"] == fingerprint:
+                    self._load_model(meta, weights, stocks, prices)
+                    return
+                if self._update_model(key, meta, weights, stocks, prices, fingerprint, verbose):
+                    return
+
+            x = []
+            y = []
+            self.noise = create_noise() if scale_values else 1.0
+            for stock, stock_prices in zip(stocks, prices):
+                stock_x, stock_y, scaling_factor = get_training_data(stock_prices, self.period, scale_values,
+                                                                     self.output_period, self.noise)
+                if len(stock_x) == 0:
+                    continue
+                self.scaling_factors[stock.get_name()] = scaling_factor
+                x.append(stock_x)
+                y.append(stock_y)
+                self.windows[stock.get_name()] = np.concatenate([stock_x[-1], stock_y[-1].reshape(-1)])[-self.period:]
+                self.last_time_stamps[stock.get_name()] = get_last_time_stamp(stock)
+            if len(x) == 0:
+                return
+            self.x = np.concatenate(x)
+            self.y = np.concatenate(y)
             self._create_network()
             self._train_model(verbose=verbose)
+            self.network = NumpyNetwork.from_model(self.model, NETWORK_ACTIVATIONS)
+            self._save_model(key, stocks, fingerprint, 0)
+
+    def _save_model(self, key: str, stocks: List, fingerprint: str, bars_since_training: int):
+        if self.registry is None:
+            return
+        self.registry.save(key, {
+            "stock_names": self.stock_names,
+            "scaling_factors": self.scaling_factors,
+            "noise": self.noise,
+            "scale_values": self.scale_values,
+            "fingerprint": fingerprint,
+            "last_time_stamp": max(get_last_time_stamp(stock) for stock in stocks),
+            "last_time_stamps": {stock.get_name(): get_last_time_stamp(stock) for stock in stocks},
+            "bars_since_training": bars_since_training
+        }, self.model.get_weights())
+
+    def _load_model(self, meta: dict, weights: List[np.ndarray], stocks: List, prices: List[np.ndarray]):
+        self.noise = meta["noise"]
+        self.scale_values = meta["scale_values"]
+        for stock, stock_prices in zip(stocks, prices):
+            self._set_window(stock.get_name(), stock_prices, get_last_time_stamp(stock),
+                             meta["scaling_factors"].get(stock.get_name()))
+
+        # No Keras model needed, it is only built when the model is trained again
+        self.network = NumpyNetwork(weights, NETWORK_ACTIVATIONS)
+
+    def _update_model(self, key: str, meta: dict, weights: List[np.ndarray], stocks: List,
+                      prices: List[np.ndarray], fingerprint: str, verbose: int = 0) -> bool:
+        # Fine-tunes the stored model on the windows of the new bars only, returns False when the model has to
+        # be trained from scratch instead
+        old_prices = []
+        new_bars = 0
+        price_drift = 0.0
+        for stock, stock_prices in zip(stocks, prices):
+            last_time_stamp = meta.get("last_time_stamps", {}).get(stock.get_name(), meta["last_time_stamp"])
+            known_bars = int(np.searchsorted(stock.get_time_stamps(), np.datetime64(last_time_stamp), side="right"))
+            scaling_factor = meta["scaling_factors"].get(stock.get_name())
+            if scaling_factor is None:
+                return False
+            old_prices.append(stock_prices[:known_bars])
+            new_bars = max(new_bars, len(stock_prices) - known_bars)
+            if known_bars < len(stock_prices):
+                price_drift = max(price_drift, float(np.nanmax(stock_prices[known_bars:], initial=0)) / scaling_factor)
+        if create_fingerprint(old_prices) != meta["fingerprint"]:
+            # Known bars were corrected, the stored model was trained on different data
+            return False
+        bars_since_training = meta.get("bars_since_training", 0) + new_bars
+        if self.update_policy.needs_full_training(bars_since_training, price_drift):
+            return False
+
+        self._load_model(meta, weights, stocks, prices)
+        x = []
+        y = []
+        for stock, stock_prices, stock_old_prices in zip(stocks, prices, old_prices):
+            # Every window ending on a new bar, starting with the input period before the first new bar
+            start = max(0, len(stock_old_prices) - self.period - self.output_period + 1)
+            stock_prices = remove_nan(stock_prices[start:])
+            if self.scale_values:
+                stock_prices = scale_data(stock_prices, self.scaling_factors[stock.get_name()], self.noise)
+            stock_x, stock_y = create_windows(stock_prices, self.period, self.output_period)
+            x.append(stock_x)
+            y.append(stock_y)
+        x = np.concatenate(x)
+        if len(x) > 0:
+            self._create_network()
+            self.model.build((None, self.period))
+            self.model.set_weights(weights)
+            self._train_model(x, np.concatenate(y), verbose=verbose, epochs=self.update_policy.epochs)
+            self.network = NumpyNetwork.from_model(self.model, NETWORK_ACTIVATIONS)
+            self._save_model(key, stocks, fingerprint, bars_since_training)
+        log_message(f"Updated model {key} with {new_bars} new bars")
+        return True
+
+    def _set_window(self, stock_name: str, prices: np.ndarray, last_time_stamp: str, scaling_factor: float = None):
+        prices = remove_nan(prices)
+        if len(prices) < self.period:
+            return
+        if scaling_factor is None:
+            scaling_factor = float(np.nanmax(prices))
+        window = prices[-self.period:]
+        if self.scale_values:
+            window = scale_data(window, scaling_factor, self.noise)
+        self.scaling_factors[stock_name] = scaling_factor
+        self.windows[stock_name] = window.astype(np.float32)
+        self.last_time_stamps[stock_name] = last_time_stamp
+
+    def add_stock(self, stock):
+        # Serve a stock the model was not trained on, e.g. from a shared universe model
+        if stock.get_name() not in self.windows:
+            self._set_window(stock.get_name(), stock.get_prices(), get_last_time_stamp(stock))
+
+    def get_architecture(self) -> str:
+        return f"{ARCHITECTURE}-{self.output_period}"
 
     def _create_network(self):
+        # Imported here, so that predicting with stored models does not load TensorFlow
+        from keras import Sequential
+        from keras.layers import Dense
+        from keras.optimizers import Adam
+
         # Avoiding ReLU to counter the "Dying ReLU" problem
         # Very big network to deny pattern creation
         self.model = Sequential([
@@ -51,7 +194,7 @@ class StockPrediction:
             #Dense(64, activation='tanh'),
             #Dense(32, activation='tanh'),
             #Dense(16, activation='tanh'),
-            Dense(1, activation='relu')  # Stock prices cannot be negative
+            Dense(self.output_period, activation='relu')  # Stock prices cannot be negative
         ])
 
         self.model.compile(
@@ -64,53 +207,50 @@ class StockPrediction:
 
         return self.model
 
-    def _train_model(self, x: List[List[float]] = None, y: List[float] = None, verbose: int = 0):
+    def _train_model(self, x: np.ndarray = None, y: np.ndarray = None, verbose: int = 0,
+                     epochs: int = TRAINING_EPOCHS):
         if x is None or y is None:
             x = self.x
             y = self.y
 
         if self.model is not None:
             # Only short training time to deny patterns and allow creativity and freedom for the network
-            self.model.fit(x, y, epochs=10, verbose=verbose)
+            self.model.fit(x, y, epochs=epochs, verbose=verbose)
 
-    def _cache_results(self, results: List[float]):
-        if len(results) < len(self.cache):
-            return
-        target_len = len(results) - len(self.cache)
-        self.cache.extend(results[-target_len:])
+    def predict_windows(self, windows: np.ndarray, period: int) -> np.ndarray:
+        # Rolls all windows forward in lockstep, one model call per step for the whole batch
+        steps = -(-period // self.output_period)
+        buffer = np.empty((len(windows), self.period + steps * self.output_period), dtype=np.float32)
+        buffer[:, :self.period] = windows
 
-    def predict_future_stock_prices(self, period: int = 28) -> List[float]:
-        if len(self.cache) >= period:
-            return self.cache[:period]
+        position = self.period
+        for _ in range(steps):
+            # Use own prediction for next period
+            buffer[:, position:position + self.output_period] = self._predict(buffer[:, position - self.period:position])
+            position += self.output_period
+        return buffer[:, self.period:self.period + period]
 
-        if self.model is None:
-            return []
+    def _forecast(self, stock_names: List[str], period: int) -> np.ndarray:
+        results = self.predict_windows(np.stack([self.windows[stock_name] for stock_name in stock_names]), period)
+        scaling_factors = np.array([self.scaling_factors[stock_name] for stock_name in stock_names])
+        # Windows are scaled by noise / scaling factor, both are undone
+        return results * scaling_factors[:, np.newaxis] / self.noise
 
-        results = []
-        current_period = self.x[-1]  # Get last period
+    def _predict(self, x: np.ndarray) -> np.ndarray:
+        return self.network(x).reshape(len(x), self.output_period)
 
-        for i in range(period):
-            # Use own prediction for next period
-            result = self._predict(current_period)
-            results.append(result)
-            current_period.pop(0)
-            current_period.append(result)
-        results = [element * self.scaling_factor for element in results]
-        results = fix_results(results)
-
-        # Replace results by cache content
-        i = 0
-        while i < len(results) and i < len(self.cache):
-            results[i] = self.cache[i]
-            i += 1
-
-        self._cache_results(results)
-        return results
-
-    def _predict(self, x: List[float]):
-        if self.model is not None:
-            return self.model(np.array([x])).numpy()[0][0]
-        return []
 
-    def is_ready(self):
-        return self.ready
+def predict_stocks(stocks: List, period: int) -> Dict[str, List[float]]:
+    # Stocks sharing a model are forecast in one batch
+    groups: Dict[int, List] = {}
+    algorithms = {}
+    for stock in stocks:
+        algorithm = stock.get_prediction_algorithm()
+        algorithm.add_stock(stock)
+        algorithms[id(algorithm)] = algorithm
+        groups.setdefault(id(algorithm), []).append(stock.get_name())
+
+    predictions = {}
+    for key, stock_names in groups.items():
+        predictions.update(algorithms[key].predict_future_stocks_prices(stock_names, period))
+    return predictions
@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from threading import Event
+from typing import Callable, Dict, List
+
+import numpy
+
+from logs.log import log_message
+from prediction.registry import ModelRegistry
+
+DEFAULT_THREADS_PER_PROCESS = 1
+
+
+class TrainingStock:
+    # Picklable stand-in for a Stock, holds only what training needs
+
+    def __init__(self, stock_name: str, prices: numpy.ndarray, time_stamps: numpy.ndarray):
+        self.stock_name = stock_name
+        self.prices = prices
+        self.time_stamps = time_stamps
+
+    def get_name(self) -> str:
+        return self.stock_name
+
+    def get_prices(self) -> numpy.ndarray:
+        return self.prices
+
+    def get_time_stamps(self) -> numpy.ndarray:
+        return self.time_stamps
+
+
+def _initialize_worker(threads: int):
+    # Must run before TensorFlow creates its thread pools
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    import tensorflow
+    tensorflow.config.threading.set_intra_op_parallelism_threads(threads)
+    tensorflow.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _train_stock(stock: TrainingStock, registry: ModelRegistry, days_input_period: int) -> bool:
+    # Imported here, so that only the worker processes load Keras
+    from prediction.stock_prediction import StockPrediction
+    prediction = StockPrediction(stock, days_input_period=days_input_period, registry=registry)
+    return prediction.network is not None
+
+
+class TrainingOrchestrator:
+
+    def __init__(self, registry: ModelRegistry, processes: int = None,
+                 threads_per_process: int = DEFAULT_THREADS_PER_PROCESS, days_input_period: int = 28):
+        self.registry = registry
+        self.processes = os.cpu_count() // threads_per_process if processes is None else processes
+        self.threads_per_process = threads_per_process
+        self.days_input_period = days_input_period
+        self.cancelled = Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def train(self, stocks: List, progress: Callable[[int, int, str], None] = None) -> Dict[str, bool]:
+        # Trains one model per stock, every worker process saves its models to the registry. Only one job per
+        # process is in flight, so that a cancelled training stops after the running jobs, which are reported too
+        self.cancelled.clear()
+        results = {}
+        processes = max(1, self.processes)
+        context = multiprocessing.get_context("spawn")  # Never fork an initialized TensorFlow runtime
+        executor = ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                       initializer=_initialize_worker, initargs=(self.threads_per_process,))
+        try:
+            remaining = iter(stocks)
+            futures = {}
+            while True:
+                while not self.cancelled.is_set() and len(futures) < processes:
+                    stock = next(remaining, None)
+                    if stock is None:
+                        break
+                    training_stock = TrainingStock(stock.get_name(), numpy.array(stock.get_prices()),
+                                                   numpy.array(stock.get_time_stamps()))
+                    future = executor.submit(_train_stock, training_stock, self.registry, self.days_input_period)
+                    futures[future] = stock.get_name()
+                if len(futures) == 0:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stock_name = futures.pop(future)
+                    try:
+                        results[stock_name] = future.result()
+                    except Exception as exception:
+                        log_message(f"Could not train model of {stock_name}: {exception}")
+                        results[stock_name] = False
+                    if progress is not None:
+                        progress(len(results), len(stocks), stock_name)
+        finally:
+            executor.shutdown(wait=True)
+        if self.cancelled.is_set():
+            log_message(f"Cancelled training after {len(results)} of {len(stocks)} models")
+        return results
+
+
+if __name__ == "__main__":
+    from stock_data.stocks import Stonks
+
+    stonks = Stonks()
+    orchestrator = TrainingOrchestrator(stonks.model_registry)
+    orchestrator.train(stonks.load_stocks(stonks.get_stock_names(), load_meta_data=False),
+                       lambda done, total, stock_name: log_message(f"Trained {stock_name} ({done}/{total})"))
@@ -0,0 +1,18 @@
+DEFAULT_MAX_NEW_BARS = 182  # Half a year of daily bars
+DEFAULT_MAX_PRICE_DRIFT = 1.25
+DEFAULT_UPDATE_EPOCHS = 3
+
+
+class UpdatePolicy:
+    # Decides whether new bars are fine-tuned into a stored model or the model is trained again from scratch
+
+    def __init__(self, max_new_bars: int = DEFAULT_MAX_NEW_BARS, max_price_drift: float = DEFAULT_MAX_PRICE_DRIFT,
+                 epochs: int = DEFAULT_UPDATE_EPOCHS):
+        self.max_new_bars = max_new_bars
+        self.max_price_drift = max_price_drift  # Highest new price relative to the scaling factor of the model
+        self.epochs = epochs
+
+    def needs_full_training(self, bars_since_training: int, price_drift: float) -> bool:
+        # Fine-tuning only on recent windows slowly forgets the older history, and scaled prices far above
+        # the trained range are extrapolated badly
+        return bars_since_training > self.max_new_bars or price_drift > self.max_price_drift
@@ -0,0 +1,107 @@
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, List
+
+from logs.log import log_message
+from util.lazy import LazyModule
+
+yfinance = LazyModule("yfinance")
+
+DEFAULT_CACHE_FILE = "meta_data.json"
+DEFAULT_TIME_TO_LIVE = 24 * 60 * 60  # Seconds
+DEFAULT_MAX_WORKERS = 8
+
+CACHE_TIME = "time"
+CACHE_INFO = "info"
+
+
+def fetch_ticker_info(stock_name: str) -> dict:
+    return yfinance.Ticker(stock_name).info
+
+
+class MetaDataService:
+
+    def __init__(self, cache_file: str = DEFAULT_CACHE_FILE, time_to_live: float = DEFAULT_TIME_TO_LIVE,
+                 max_workers: int = DEFAULT_MAX_WORKERS, keys: List[str] = None,
+                 fetcher: Callable[[str], dict] = fetch_ticker_info):
+        self.cache_file = cache_file
+        self.time_to_live = time_to_live
+        self.keys = keys
+        self.fetcher = fetcher
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = Lock()
+        self.save_lock = Lock()  # Fetch threads finishing at the same time share the temporary file
+        self.futures: Dict[str, Future] = {}
+        self.cache: Dict[str, dict] = self.load_cache()
+
+    def load_cache(self) -> dict:
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        if self.cache_file is None:
+            return
+        with self.lock:
+            content = json.dumps({stock_name: entry for stock_name, entry in self.cache.items() if entry[CACHE_INFO]},
+                                 default=str)
+        temp_file = f"{self.cache_file}.tmp"
+        with self.save_lock:
+            with open(temp_file, "w") as file:
+                file.write(content)
+            os.replace(temp_file, self.cache_file)
+
+    def is_fresh(self, stock_name: str) -> bool:
+        entry = self.cache.get(stock_name)
+        return entry is not None and time.time() - entry[CACHE_TIME] < self.time_to_live
+
+    def prefetch(self, stock_names: List[str]) -> List[Future]:
+        with self.lock:
+            return [self._submit(stock_name) for stock_name in stock_names if not self.is_fresh(stock_name)]
+
+    def get_info(self, stock_name: str) -> dict:
+        with self.lock:
+            if self.is_fresh(stock_name):
+                return self.cache[stock_name][CACHE_INFO]
+            future = self._submit(stock_name)
+        return future.result()
+
+    def _submit(self, stock_name: str) -> Future:
+        # Requires self.lock, so that every ticker is only requested once at a time
+        if stock_name not in self.futures:
+            self.futures[stock_name] = self.executor.submit(self._fetch, stock_name)
+        return self.futures[stock_name]
+
+    def _fetch(self, stock_name: str) -> dict:
+        entry = None
+        try:
+            info = self.fetcher(stock_name)
+            if self.keys is not None:
+                info = {key: info[key] for key in self.keys if key in info}
+            entry = {CACHE_TIME: time.time(), CACHE_INFO: info}
+        except Exception as exception:
+            log_message(f"Could not fetch meta data of {stock_name}: {exception}")
+
+        with self.lock:
+            if entry is None:
+                # Keep outdated information if there is any. Without any, the entry is stored as expired, so that
+                # the next access requests it again
+                entry = self.cache.get(stock_name, {CACHE_TIME: 0, CACHE_INFO: {}})
+            self.cache[stock_name] = entry
+            del self.futures[stock_name]
+            finished = len(self.futures) == 0
+
+        if finished:
+            # Write once per batch instead of once per ticker, a failed write must not fail the lookup
+            try:
+                self.save_cache()
+            except OSError as exception:
+                log_message(f"Could not save meta data cache: {exception}")
+        return entry[CACHE_INFO]
@@ -0,0 +1,148 @@
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy
+import pandas as pd
+
+from logs.log import log_message
+from util.util import TARGET_INDEX, download_stock_data, encode_file_name
+
+DEFAULT_STORE_DIRECTORY = "price_data"
+DEFAULT_PERIOD = "10y"
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0  # Seconds, doubled after every failed attempt
+
+RECORD_TYPE = numpy.dtype([("time_stamp", "datetime64[ns]"), ("price", "float64")])
+
+# Signature of yfinance.download: (stock_names, period, start) -> frame with (Close, stock_name) columns
+PriceFetcher = Callable[..., pd.DataFrame]
+
+
+class FrameFetcher:
+    # Serves a fixed frame in the yfinance.download layout, e.g. for offline testing
+
+    def __init__(self, data: pd.DataFrame):
+        self.data = data
+
+    def __call__(self, stock_names: List[str], period: str = None, start: pd.Timestamp = None) -> pd.DataFrame:
+        data = self.data[[column for column in self.data.columns if column[1] in stock_names]]
+        if start is not None:
+            data = data[data.index >= start]
+        return data
+
+
+class PriceStore:
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIRECTORY, fetcher: PriceFetcher = download_stock_data,
+                 period: str = DEFAULT_PERIOD, batch_size: int = DEFAULT_BATCH_SIZE, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF):
+        self.directory = directory
+        self.fetcher = fetcher
+        self.period = period
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_file(self, stock_name: str) -> str:
+        return os.path.join(self.directory, f"{encode_file_name(stock_name)}.npy")
+
+    def load(self, stock_name: str, memory_map: bool = True) -> Optional[numpy.ndarray]:
+        file = self.get_file(stock_name)
+        if not os.path.exists(file):
+            return None
+        return numpy.load(file, mmap_mode="r" if memory_map else None)
+
+    def save(self, stock_name: str, records: numpy.ndarray):
+        file = self.get_file(stock_name)
+        temp_file = f"{file}.tmp"
+        with open(temp_file, "wb") as handle:
+            numpy.save(handle, records)
+        os.replace(temp_file, file)
+
+    def get_last_time_stamp(self, stock_name: str) -> Optional[numpy.datetime64]:
+        records = self.load(stock_name)
+        if records is None or len(records) == 0:
+            return None
+        return records["time_stamp"][-1]
+
+    def update(self, stock_names: List[str]):
+        for _ in self.stream_update(stock_names):
+            pass
+
+    def stream_update(self, stock_names: List[str]) -> Iterator[List[str]]:
+        # Yields every batch of stock names as soon as its prices are stored
+        for start in range(0, len(stock_names), self.batch_size):
+            batch = stock_names[start:start + self.batch_size]
+            last_time_stamps = {stock_name: self.get_last_time_stamp(stock_name) for stock_name in batch}
+            missing = [stock_name for stock_name, time_stamp in last_time_stamps.items() if time_stamp is None]
+            stored = [stock_name for stock_name, time_stamp in last_time_stamps.items() if time_stamp is not None]
+
+            if len(missing) > 0:
+                self._fetch(missing, period=self.period)
+            # Stocks are refetched from the day of their own last stored bar, one request per day, so that a halted
+            # or delisted stock does not make the whole batch download years of bars again
+            days: Dict[numpy.datetime64, List[str]] = {}
+            for stock_name in stored:
+                days.setdefault(last_time_stamps[stock_name].astype("datetime64[D]"), []).append(stock_name)
+            for day, day_stock_names in sorted(days.items()):
+                # Refetch the last stored bar as well, it may have been incomplete when it was saved
+                self._fetch(day_stock_names, start=pd.Timestamp(day))
+            yield batch
+
+    def _download(self, stock_names: List[str], period: str = None, start: pd.Timestamp = None) -> pd.DataFrame:
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                data = self.fetcher(stock_names, period=period, start=start)
+                if data is not None and not data.empty:
+                    return data
+                log_message(f"Received no price data for {len(stock_names)} stocks (attempt {attempt + 1})")
+            except Exception as exception:
+                log_message(f"Could not fetch price data of {len(stock_names)} stocks (attempt {attempt + 1}): "
+                            f"{exception}")
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        return None
+
+    def _fetch(self, stock_names: List[str], period: str = None, start: pd.Timestamp = None):
+        data = self._download(stock_names, period=period, start=start)
+        if data is None:
+            return
+        for stock_name in stock_names:
+            if (TARGET_INDEX, stock_name) in data.columns:
+                self._merge(stock_name, data[(TARGET_INDEX, stock_name)])
+        log_message(f"Fetched price data of {len(stock_names)} stocks")
+
+    def _merge(self, stock_name: str, prices: pd.Series):
+        prices = prices.dropna()
+        if len(prices) == 0:
+            return
+
+        records = numpy.empty(len(prices), dtype=RECORD_TYPE)
+        records["time_stamp"] = prices.index.values.astype("datetime64[ns]")
+        records["price"] = prices.to_numpy(dtype=numpy.float64)
+
+        stored = self.load(stock_name, memory_map=False)
+        if stored is not None:
+            stored = stored[stored["time_stamp"] < records["time_stamp"][0]]
+            records = numpy.concatenate([stored, records])
+        self.save(stock_name, records)
+
+    def get_data(self, stock_names: List[str]) -> pd.DataFrame:
+        # Rebuild the yfinance.download layout from the stored records
+        columns: Dict[str, pd.Series] = {}
+        for stock_name in stock_names:
+            records = self.load(stock_name)
+            if records is not None and len(records) > 0:
+                columns[stock_name] = pd.Series(records["price"], index=records["time_stamp"])
+
+        if len(columns) == 0:
+            return pd.DataFrame(columns=pd.MultiIndex.from_tuples([], names=[None, None]))
+
+        data = pd.concat(columns, axis=1).sort_index()
+        data.columns = pd.MultiIndex.from_product([[TARGET_INDEX], data.columns])
+        return data
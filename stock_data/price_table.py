@@ -0,0 +1,55 @@
+from typing import List
+
+import numpy
+import pandas as pd
+
+from util.util import fill_price_data
+
+TIME_STAMP_TYPE = "datetime64[ns]"
+
+
+class PriceHistory:
+    # Daily prices of a single stock, both arrays are views into the buffers of a PriceTable
+    __slots__ = ("prices", "epochs")
+
+    def __init__(self, prices: numpy.ndarray, epochs: numpy.ndarray):
+        self.prices = prices
+        self.epochs = epochs
+
+    def __len__(self):
+        return len(self.prices)
+
+    def get_prices(self, period: int = -1) -> numpy.ndarray:
+        if period == -1:
+            return self.prices
+        return self.prices[-period:]
+
+    def get_time_stamps(self, period: int = -1) -> numpy.ndarray:
+        epochs = self.epochs if period == -1 else self.epochs[-period:]
+        return epochs.view(TIME_STAMP_TYPE)
+
+
+class PriceTable:
+    # One buffer for all stocks: a row of prices per stock and a shared row of epoch nanoseconds
+    __slots__ = ("epochs", "prices", "stock_names", "indices")
+
+    def __init__(self, data: pd.DataFrame, dtype: numpy.dtype = numpy.float64):
+        time_stamps, prices, self.stock_names = fill_price_data(data)
+        self.epochs: numpy.ndarray = time_stamps.astype(TIME_STAMP_TYPE).view(numpy.int64)
+        self.prices: numpy.ndarray = prices.astype(dtype, copy=False)
+        self.indices = {stock_name: i for i, stock_name in enumerate(self.stock_names)}
+
+    def has_stock(self, stock_name: str) -> bool:
+        return stock_name in self.indices
+
+    def get_stock_names(self) -> List[str]:
+        return self.stock_names
+
+    def get_history(self, stock_name: str) -> PriceHistory:
+        return PriceHistory(self.prices[self.indices[stock_name]], self.epochs)
+
+    def get_prices(self, stock_name: str) -> numpy.ndarray:
+        return self.prices[self.indices[stock_name]]
+
+    def get_time_stamps(self) -> numpy.ndarray:
+        return self.epochs.view(TIME_STAMP_TYPE)
@@ -9,9 +9,9 @@ class StockPage:
         self.page_contents = page_contents
         self.stock_names = stock_names
 
-    def update_stock_names(self, stock_names: str):
-        self.page_index = 0
+    def update_stock_names(self, stock_names: List[str], reset_page: bool = True):
         self.stock_names = stock_names
+        self.page_index = 0 if reset_page else max(0, min(self.page_index, self.get_max_pages()))
 
     def get_page(self) -> List[str]:
         return self.stock_names[self.page_contents * self.page_index: self.page_contents * (self.page_index + 1):]
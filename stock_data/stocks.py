@@ -1,13 +1,21 @@
-from typing import List
+import os
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Set
 from enum import Enum
+from threading import Lock
 
 import numpy
-import pandas as pd
-import yfinance
 
-from prediction.stock_prediction import StockPrediction
-from util.util import get_value, download_stock_names, download_stock_data, fill_data, \
-    calculate_stock_trend
+from prediction.forecast_cache import ForecastCache, DEFAULT_FORECAST_CACHE_FILE
+from prediction.forecasters import Forecaster, DEFAULT_FORECASTER, FORECASTERS, FORECASTER_VARIABLE, \
+    NETWORK_FORECASTER, create_forecaster
+from prediction.registry import ModelRegistry
+from prediction.stock_prediction import StockPrediction, predict_stocks
+from stock_data.meta_data import MetaDataService, DEFAULT_MAX_WORKERS
+from stock_data.price_store import PriceStore
+from stock_data.price_table import PriceTable, PriceHistory
+from stock_data.universe import DEFAULT_CHUNK_SIZE, UNIVERSE_VARIABLE, load_stock_names
+from util.util import get_value, calculate_stock_trend
 
 # DEPRECATED TICKER_LIST_URL = "https://www.cboe.com/us/equities/market_statistics/listed_symbols/csv"
 TARGET_INDEX = "Close"
@@ -43,6 +51,12 @@ class StockInfoKey:
     VOLUME = "volume"
 
 
+META_DATA_KEYS = [StockInfoKey.BID_PRICE, StockInfoKey.BID_SIZE, StockInfoKey.ASK_PRICE, StockInfoKey.ASK_SIZE,
+                  StockInfoKey.CURRENCY, StockInfoKey.TRADEABLE, StockInfoKey.SHORT_NAME, StockInfoKey.LONG_NAME,
+                  StockInfoKey.WEBSITE, StockInfoKey.COUNTRY, StockInfoKey.CITY, StockInfoKey.SECTOR,
+                  StockInfoKey.INDUSTRY, StockInfoKey.VOLUME, StockInfoKey.DIVIDEND_RATE, StockInfoKey.DIVIDEND_YIELD]
+
+
 DEFAULT_STOCK_INFO = {
     StockInfoKey.BID_PRICE: "No information",
     StockInfoKey.BID_SIZE: "No information",
@@ -67,23 +81,39 @@ class Period(Enum):
     TEN_YEARS = "10y"
 
 
-class Stock:
-    prediction_algorithm: StockPrediction = None
+class MissingPricesError(KeyError):
+    # No price data could be loaded for the stock, e.g. it is delisted or the download failed
+    pass
 
-    def __init__(self, data_frame: pd.DataFrame, stock_name: str):
-        self.stock_name = stock_name
-        self.data: pd.DataFrame = data_frame
 
-        trend_data = fill_data(self.data, stock_name)
+class PredictionMode(Enum):
+    STOCK = 0  # One model per stock
+    UNIVERSE = 1  # One model shared by all stocks
+
 
-        self.prices = trend_data[PRICE]
-        self.time_stamps = trend_data.index.values
-        self.meta_data = self.create_meta_data()
+class Stock:
+    prediction_algorithm: Forecaster = None
 
-    def create_meta_data(self):
-        ticker_info = yfinance.Ticker(self.stock_name).info
-        if ticker_info[StockInfoKey.ASK_PRICE] == 0:
-            ticker_info[StockInfoKey.ASK_PRICE] = self.prices[-1]
+    def __init__(self, price_table: PriceTable, stock_name: str, meta_data_service: MetaDataService,
+                 prediction_provider: Callable[["Stock"], Forecaster] = None):
+        self.stock_name = stock_name
+        self.price_table = price_table
+        self.meta_data_service = meta_data_service
+        self.prediction_provider = prediction_provider
+
+        # Resolved on first access
+        self.history: PriceHistory = None
+        self.meta_data: dict = None
+
+    def get_meta_data(self) -> dict:
+        # Fetched on first use, the service may already have it cached or prefetched
+        if self.meta_data is None:
+            self.meta_data = self.create_meta_data(dict(self.meta_data_service.get_info(self.stock_name)))
+        return self.meta_data
+
+    def create_meta_data(self, ticker_info: dict):
+        if not get_value(StockInfoKey.ASK_PRICE, ticker_info):
+            ticker_info[StockInfoKey.ASK_PRICE] = self.get_prices()[-1]
         return {
             StockInfoKey.BID_PRICE: get_value(StockInfoKey.BID_PRICE, ticker_info),
             StockInfoKey.BID_SIZE: get_value(StockInfoKey.BID_SIZE, ticker_info),
@@ -107,96 +137,235 @@ class Stock:
         return self.stock_name
 
     def get_stock_trend(self, period: int):
-        return calculate_stock_trend(self.prices, period)
+        return calculate_stock_trend(self.get_prices(), period)
 
     def get_bid_price(self):
-        return self.meta_data[StockInfoKey.BID_PRICE]
+        return self.get_meta_data()[StockInfoKey.BID_PRICE]
 
     def get_bid_size(self):
-        return self.meta_data[StockInfoKey.BID_SIZE]
+        return self.get_meta_data()[StockInfoKey.BID_SIZE]
 
     def get_ask_price(self):
-        return self.meta_data[StockInfoKey.ASK_PRICE]
+        return self.get_meta_data()[StockInfoKey.ASK_PRICE]
 
     def get_ask_price_cents(self):
         return self.get_ask_price() * 100
 
     def get_ask_size(self):
-        return self.meta_data[StockInfoKey.ASK_SIZE]
+        return self.get_meta_data()[StockInfoKey.ASK_SIZE]
 
     def get_currency(self):
-        return self.meta_data[StockInfoKey.CURRENCY]
+        return self.get_meta_data()[StockInfoKey.CURRENCY]
 
     def is_tradeable(self):
-        return self.meta_data[StockInfoKey.TRADEABLE]
+        return self.get_meta_data()[StockInfoKey.TRADEABLE]
 
     def get_short_name(self):
-        return self.meta_data[StockInfoKey.SHORT_NAME]
+        return self.get_meta_data()[StockInfoKey.SHORT_NAME]
 
     def get_long_name(self):
-        return self.meta_data[StockInfoKey.LONG_NAME]
+        return self.get_meta_data()[StockInfoKey.LONG_NAME]
 
     def get_dividend_rate(self):
-        return self.meta_data[StockInfoKey.DIVIDEND_RATE]
+        return self.get_meta_data()[StockInfoKey.DIVIDEND_RATE]
 
     def get_dividend_yield(self):
-        return self.meta_data[StockInfoKey.DIVIDEND_YIELD]
+        return self.get_meta_data()[StockInfoKey.DIVIDEND_YIELD]
 
     def get_country(self):
-        return self.meta_data[StockInfoKey.COUNTRY]
+        return self.get_meta_data()[StockInfoKey.COUNTRY]
 
     def get_city(self):
-        return self.meta_data[StockInfoKey.CITY]
+        return self.get_meta_data()[StockInfoKey.CITY]
 
     def get_volume(self):
-        return self.meta_data[StockInfoKey.VOLUME]
+        return self.get_meta_data()[StockInfoKey.VOLUME]
 
     def get_website(self):
-        return self.meta_data[StockInfoKey.WEBSITE]
+        return self.get_meta_data()[StockInfoKey.WEBSITE]
 
     def get_sector(self):
-        return self.meta_data[StockInfoKey.SECTOR]
+        return self.get_meta_data()[StockInfoKey.SECTOR]
 
     def get_industry(self):
-        return self.meta_data[StockInfoKey.INDUSTRY]
+        return self.get_meta_data()[StockInfoKey.INDUSTRY]
+
+    def get_history(self) -> PriceHistory:
+        if self.history is None:
+            self.history = self.price_table.get_history(self.stock_name)
+        return self.history
+
+    def get_prices(self, period: int = -1) -> numpy.ndarray:
+        return self.get_history().get_prices(period)
 
-    def get_prices(self, period: int = -1):
-        if period == -1:
-            return self.prices
-        return self.prices[-period:]
+    def get_time_stamps(self, period: int = -1) -> numpy.ndarray:
+        return self.get_history().get_time_stamps(period)
 
-    def get_time_stamps(self, period: int = -1) -> List[numpy.datetime64]:
-        if period == -1:
-            return self.time_stamps
-        return self.time_stamps[-period:]
+    def get_prediction_algorithm(self) -> Forecaster:
+        if self.prediction_algorithm is None:
+            if self.prediction_provider is None:
+                self.prediction_algorithm = StockPrediction(self, threading=False)
+            else:
+                self.prediction_algorithm = self.prediction_provider(self)
+        return self.prediction_algorithm
 
     def get_prediction(self, period: int) -> List[float]:
+        if period <= 0:
+            # Nothing to predict, do not train a model for it
+            return []
+        prediction_algorithm = self.get_prediction_algorithm()
+        prediction_algorithm.add_stock(self)
+        return prediction_algorithm.predict_future_stock_prices(period, self.stock_name)
+
+    def get_cached_prediction(self, period: int) -> Optional[List[float]]:
+        if period <= 0:
+            return []
         if self.prediction_algorithm is None:
-            self.prediction_algorithm = StockPrediction(self, threading=False)
-        return self.prediction_algorithm.predict_future_stock_prices(period)
+            return None
+        return self.prediction_algorithm.get_cached_prediction(self.stock_name, period)
 
 
 class Stonks:
 
-    def __init__(self, stock_names=None):
-        self.stock_names = download_stock_names() if stock_names is None else stock_names
-        self.stock_data = download_stock_data(self.stock_names, Period.TEN_YEARS.value)
+    def __init__(self, stock_names=None, price_store: PriceStore = None, meta_data_service: MetaDataService = None,
+                 pool_size: int = DEFAULT_MAX_WORKERS, price_type: numpy.dtype = numpy.float64,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, model_registry: ModelRegistry = None,
+                 prediction_mode: PredictionMode = PredictionMode.STOCK, forecast_cache: ForecastCache = None,
+                 forecaster: str = None, universe_file: str = None):
+        if stock_names is None:
+            # The listing file of the universe is chosen per deployment, the built-in stock names are the default
+            universe_file = os.environ.get(UNIVERSE_VARIABLE) if universe_file is None else universe_file
+            stock_names = load_stock_names(universe_file)
+        self.stock_names = list(stock_names)
+        self.stock_indices = {stock_name: i for i, stock_name in enumerate(self.stock_names)}
+        self.chunk_size = chunk_size
+        self.price_type = price_type
+        self.price_store = PriceStore(period=Period.TEN_YEARS.value) if price_store is None else price_store
+        self.meta_data_service = MetaDataService(keys=META_DATA_KEYS, max_workers=pool_size) \
+            if meta_data_service is None else meta_data_service
+        self.model_registry = ModelRegistry() if model_registry is None else model_registry
+        self.prediction_mode = prediction_mode
+        self.forecast_cache = ForecastCache(DEFAULT_FORECAST_CACHE_FILE) if forecast_cache is None else forecast_cache
+        # The network or one of the statistical forecasters, chosen per deployment
+        self.forecaster = os.environ.get(FORECASTER_VARIABLE, DEFAULT_FORECASTER) if forecaster is None else forecaster
+        if self.forecaster != NETWORK_FORECASTER and self.forecaster not in FORECASTERS:
+            raise ValueError(f"Unknown forecaster {self.forecaster}")
+        self.universe_prediction: Forecaster = None
+        self.prediction_lock = Lock()
+        self.price_tables: Dict[str, PriceTable] = {}  # Prices are loaded one chunk of stock names at a time
+        self.price_futures: Dict[str, Future] = {}  # Downloads in progress, shared by all stock names of a chunk
+        self.missing_stock_names: Set[str] = set()  # Stocks without price data, not requested again
         self.stocks: dict = {}
+        self.stocks_lock = Lock()
+
+    def get_chunk(self, stock_name: str) -> List[str]:
+        if stock_name not in self.stock_indices:
+            return [stock_name]
+        start = (self.stock_indices[stock_name] // self.chunk_size) * self.chunk_size
+        return self.stock_names[start:start + self.chunk_size]
+
+    def load_prices(self, stock_names: List[str]):
+        # The lock is only held to claim stock names and to store the results, so that stocks that are already
+        # loaded can be served while a chunk downloads. Every stock name is only requested once at a time
+        future = Future()
+        with self.stocks_lock:
+            pending = {self.price_futures[stock_name] for stock_name in stock_names
+                       if stock_name in self.price_futures}
+            stock_names = [stock_name for stock_name in stock_names if stock_name not in self.price_tables and
+                           stock_name not in self.missing_stock_names and stock_name not in self.price_futures]
+            for stock_name in stock_names:
+                self.price_futures[stock_name] = future
+
+        try:
+            for batch in self.price_store.stream_update(stock_names):
+                data = self.price_store.get_data(batch)
+                if data.empty:
+                    continue
+                price_table = PriceTable(data, self.price_type)
+                with self.stocks_lock:
+                    for stock_name in price_table.get_stock_names():
+                        self.price_tables[stock_name] = price_table
+            with self.stocks_lock:
+                self.missing_stock_names.update(stock_name for stock_name in stock_names
+                                                if stock_name not in self.price_tables)
+        finally:
+            with self.stocks_lock:
+                for stock_name in stock_names:
+                    del self.price_futures[stock_name]
+            future.set_result(None)
+
+        for other_future in pending:
+            other_future.result()
 
     def get_stock(self, stock_name: str) -> Stock:
-        if stock_name not in self.stocks:
-            self.stocks[stock_name] = Stock(self.stock_data, stock_name)
-        return self.stocks[stock_name]
-
-    def get_stocks(self, stock_names: List[str]):
+        with self.stocks_lock:
+            if stock_name in self.stocks:
+                return self.stocks[stock_name]
+        if stock_name not in self.price_tables:
+            self.load_prices(self.get_chunk(stock_name))
+        with self.stocks_lock:
+            if stock_name not in self.price_tables:
+                raise MissingPricesError(stock_name)
+            if stock_name not in self.stocks:
+                self.stocks[stock_name] = Stock(self.price_tables[stock_name], stock_name, self.meta_data_service,
+                                                 self.get_prediction_algorithm)
+            return self.stocks[stock_name]
+
+    def get_stocks(self, stock_names: List[str], load_meta_data: bool = False):
+        # Price series are views into the shared price table, only the meta data requires network access
+        if load_meta_data:
+            self.prefetch_meta_data(stock_names)
         stocks = []
         for stock_name in stock_names:
-            stocks.append(self.get_stock(stock_name))
+            stock = self.get_stock(stock_name)
+            if load_meta_data:
+                stock.get_meta_data()
+            stocks.append(stock)
         return stocks
 
     def get_stock_names(self) -> List[str]:
         return self.stock_names
 
+    def get_prediction_algorithm(self, stock: Stock) -> Forecaster:
+        if self.forecaster != NETWORK_FORECASTER:
+            with self.prediction_lock:
+                if self.universe_prediction is None:
+                    # Statistical forecasters are fitted for all requested stocks in one batch
+                    self.universe_prediction = create_forecaster(self.forecaster, forecast_cache=self.forecast_cache)
+                return self.universe_prediction
+
+        if self.prediction_mode == PredictionMode.STOCK:
+            return StockPrediction(stock, threading=False, registry=self.model_registry,
+                                   forecast_cache=self.forecast_cache)
+
+        with self.prediction_lock:
+            if self.universe_prediction is None:
+                # Trained once on the whole universe, serves every stock
+                stocks = self.load_stocks(self.stock_names, load_meta_data=False)
+                self.universe_prediction = StockPrediction(stocks, threading=False, registry=self.model_registry,
+                                                           forecast_cache=self.forecast_cache)
+            return self.universe_prediction
+
+    def get_cached_predictions(self, stock_names: List[str], period: int) -> Dict[str, Optional[List[float]]]:
+        # Stocks without price data are left out
+        return {stock.get_name(): stock.get_cached_prediction(period)
+                for stock in self.load_stocks(stock_names, load_meta_data=False)}
+
+    def get_predictions(self, stock_names: List[str], period: int) -> Dict[str, List[float]]:
+        # Stocks without price data are left out
+        stocks = self.load_stocks(stock_names, load_meta_data=False)
+        if period <= 0:
+            return {stock.get_name(): [] for stock in stocks}
+        return predict_stocks(stocks, period)
+
+    def prefetch_meta_data(self, stock_names: List[str] = None):
+        self.meta_data_service.prefetch(self.stock_names if stock_names is None else stock_names)
+
+    def load_stocks(self, stock_names: List[str], load_meta_data: bool = True) -> List[Stock]:
+        # Stocks without price data are skipped
+        self.load_prices(stock_names)
+        stock_names = [stock_name for stock_name in stock_names if stock_name in self.price_tables]
+        return self.get_stocks(stock_names, load_meta_data)
+
     def fetch(self):
-        for stock_name in self.stock_names:
-            _ = self.get_stock(stock_name)
+        self.get_stocks(self.stock_names, load_meta_data=True)
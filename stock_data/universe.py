@@ -0,0 +1,46 @@
+import csv
+import os
+from typing import Iterable, Iterator, List
+
+from util.util import download_stock_names
+
+DEFAULT_SYMBOL_COLUMN = "Symbol"
+DEFAULT_EXCHANGE_COLUMN = "Exchange"
+DEFAULT_CHUNK_SIZE = 50
+UNIVERSE_VARIABLE = "STONKS_UNIVERSE"  # Environment variable naming the listing file of a deployment
+
+
+def read_stock_names(file: str, symbol_column: str = DEFAULT_SYMBOL_COLUMN, exchanges: List[str] = None,
+                     exchange_column: str = DEFAULT_EXCHANGE_COLUMN, suffixes: List[str] = None) -> Iterator[str]:
+    # Streams the listing file row by row, so its size does not matter
+    with open(file, "r", newline="", encoding="utf-8") as handle:
+        for row in csv.DictReader(handle):
+            stock_name = (row.get(symbol_column) or "").strip()
+            if stock_name == "":
+                continue
+            if exchanges is not None and row.get(exchange_column) not in exchanges:
+                continue
+            if suffixes is not None and not stock_name.endswith(tuple(suffixes)):
+                continue
+            yield stock_name
+
+
+def load_stock_names(file: str = None, **filters) -> List[str]:
+    # The built-in stock names are only used without a listing file, a missing one is an error
+    if file is None:
+        return download_stock_names()
+    if not os.path.exists(file):
+        raise FileNotFoundError(f"Listing file {file} does not exist")
+    # Keep the listing order, drop duplicates
+    return list(dict.fromkeys(read_stock_names(file, **filters)))
+
+
+def chunk_stock_names(stock_names: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[str]]:
+    chunk = []
+    for stock_name in stock_names:
+        chunk.append(stock_name)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
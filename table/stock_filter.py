@@ -0,0 +1,102 @@
+from typing import List
+
+import numpy
+
+INITIAL_CAPACITY = 64
+
+
+class StockFilter:
+
+    def __init__(self, search: str = "", price_min: float = -numpy.inf, price_max: float = numpy.inf,
+                 positive_trends: bool = True, negative_trends: bool = True, min_yield: float = -numpy.inf):
+        self.search = search.lower()
+        self.price_min = price_min
+        self.price_max = price_max
+        self.positive_trends = positive_trends
+        self.negative_trends = negative_trends
+        self.min_yield = min_yield
+
+    def get_key(self) -> tuple:
+        return (self.search, self.price_min, self.price_max, self.positive_trends, self.negative_trends,
+                self.min_yield)
+
+
+class StockFilterIndex:
+    # Columnar copy of the filterable values of the stock table, in table row order
+
+    def __init__(self):
+        self.size = 0
+        self.names: List[str] = []  # Lower case, searched by substring
+        self.prices = numpy.empty(INITIAL_CAPACITY)
+        self.trends = numpy.empty(INITIAL_CAPACITY)
+        self.yields = numpy.empty(INITIAL_CAPACITY)
+        self.visible = numpy.empty(INITIAL_CAPACITY, dtype=bool)  # Visibility last applied to the view
+        self.mask: numpy.ndarray = None  # Result of the last filter, extended when rows are added
+        self.mask_key: tuple = None
+
+    def __len__(self):
+        return self.size
+
+    def append(self, name: str, price: float, trend: float, stock_yield: float):
+        if self.size == len(self.prices):
+            self._grow()
+        self.names.append(name.lower())
+        self.prices[self.size] = price
+        self.trends[self.size] = trend
+        self.yields[self.size] = stock_yield
+        self.visible[self.size] = True  # New rows are shown until a filter hides them
+        self.size += 1
+
+    def _grow(self):
+        for attribute in ("prices", "trends", "yields", "visible"):
+            values = getattr(self, attribute)
+            grown = numpy.empty(2 * len(values), dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            setattr(self, attribute, grown)
+
+    def reorder(self, rows: List[int]):
+        # Applies the row order of a sorted table, rows[i] is the old position of the new row i
+        rows = numpy.asarray(rows, dtype=numpy.intp)
+        for values in (self.prices, self.trends, self.yields, self.visible):
+            values[:self.size] = values[rows]
+        self.names = [self.names[row] for row in rows]
+        if self.mask is not None and len(self.mask) == self.size:
+            self.mask = self.mask[rows]
+        else:
+            self.mask_key = None
+
+    def get_mask(self, stock_filter: StockFilter, start: int = 0) -> numpy.ndarray:
+        # Rows from start on that pass the filter, values outside of a range are only hidden if they are known
+        prices = self.prices[start:self.size]
+        trends = self.trends[start:self.size]
+        hidden = (prices < stock_filter.price_min) | (prices > stock_filter.price_max) | \
+                 (self.yields[start:self.size] < stock_filter.min_yield)
+        if not stock_filter.positive_trends:
+            hidden |= trends > 0
+        if not stock_filter.negative_trends:
+            hidden |= trends < 0
+        if stock_filter.search != "":
+            hidden |= ~numpy.fromiter((stock_filter.search in name for name in self.names[start:self.size]),
+                                      dtype=bool, count=self.size - start)
+        return ~hidden
+
+    def update_mask(self, stock_filter: StockFilter) -> numpy.ndarray:
+        # Only rows added since the last call with the same filter are evaluated
+        if stock_filter.get_key() != self.mask_key:
+            self.mask = self.get_mask(stock_filter)
+            self.mask_key = stock_filter.get_key()
+        elif len(self.mask) < self.size:
+            self.mask = numpy.concatenate([self.mask, self.get_mask(stock_filter, len(self.mask))])
+        return self.mask
+
+    def update_visible(self, mask: numpy.ndarray) -> numpy.ndarray:
+        # Returns the rows whose visibility changed
+        changed = numpy.flatnonzero(self.visible[:self.size] != mask)
+        self.visible[:self.size] = mask
+        return changed
+
+
+def get_page_mask(mask: numpy.ndarray, page_index: int, page_size: int) -> numpy.ndarray:
+    # Rows passing the filter are paged in table order
+    ranks = numpy.cumsum(mask) - 1
+    return mask & (ranks // page_size == page_index)
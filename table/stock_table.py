@@ -0,0 +1,128 @@
+from enum import Enum
+from typing import List
+
+import numpy
+from PyQt5 import QtCore, QtGui
+
+from stock_data.stocks import Stock
+from table.stock_filter import StockFilterIndex
+
+SPARKLINE_PERIOD = 28
+SPARKLINE_ROLE = QtCore.Qt.ItemDataRole.UserRole
+
+
+class StockTableColumn(Enum):
+    INFO = 0
+    ID = 1
+    NAME = 2
+    PRICE = 3
+    DIFF = 4
+    YIELD = 5
+    GRAPH = 6
+
+
+COLUMN_HEADERS = ["", "Stock ID", "Stock Name", "Price (€)", "Diff (%)", "Yield (%)", "Graph"]
+
+
+def format_trend(trend: float) -> str:
+    sign = "+" if trend > 0 else ""
+    return f"{sign}{'{:4.2f}'.format(trend)}%"
+
+
+class StockTableModel(QtCore.QAbstractTableModel):
+    # Holds one entry per stock in plain columns, the view only asks for the rows it paints
+
+    def __init__(self, parent: QtCore.QObject = None):
+        super(StockTableModel, self).__init__(parent)
+        self.stock_names: List[str] = []
+        self.long_names: List[str] = []
+        self.prices: List[float] = []
+        self.trends: List[float] = []
+        self.yields: List[float] = []
+        self.sparklines: List[numpy.ndarray] = []
+        self.filter_index = StockFilterIndex()
+        self.sort_column: int = None
+        self.sort_order = QtCore.Qt.SortOrder.AscendingOrder
+        self.info_icon = QtGui.QIcon("assets/info_logo.png")
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.stock_names)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMN_HEADERS)
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int = QtCore.Qt.ItemDataRole.DisplayRole):
+        if orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return COLUMN_HEADERS[section]
+        return super(StockTableModel, self).headerData(section, orientation, role)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            if column == StockTableColumn.ID.value:
+                return self.stock_names[row]
+            if column == StockTableColumn.NAME.value:
+                return self.long_names[row]
+            if column == StockTableColumn.PRICE.value:
+                return self.prices[row]
+            if column == StockTableColumn.DIFF.value:
+                return format_trend(self.trends[row])
+            if column == StockTableColumn.YIELD.value:
+                return self.yields[row]
+        elif role == QtCore.Qt.ItemDataRole.DecorationRole and column == StockTableColumn.INFO.value:
+            return self.info_icon
+        elif role == SPARKLINE_ROLE and column == StockTableColumn.GRAPH.value:
+            return self.sparklines[row]
+        return None
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlags:
+        return QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable
+
+    def append_stocks(self, stocks: List[Stock]):
+        if len(stocks) == 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.stock_names), len(self.stock_names) + len(stocks) - 1)
+        for stock in stocks:
+            self.stock_names.append(stock.get_name())
+            self.long_names.append(str(stock.get_long_name()))
+            self.prices.append(stock.get_ask_price())
+            self.trends.append(stock.get_stock_trend(SPARKLINE_PERIOD))
+            self.yields.append(round(stock.get_dividend_yield() * 100, 4))
+            self.sparklines.append(stock.get_prices(SPARKLINE_PERIOD))
+            self.filter_index.append(self.long_names[-1], self.prices[-1], self.trends[-1], self.yields[-1])
+        self.endInsertRows()
+        if self.sort_column is not None:
+            # Stocks are loaded page by page, new rows take their place in the sorted table
+            self.sort(self.sort_column, self.sort_order)
+
+    def get_stock_name(self, row: int) -> str:
+        return self.stock_names[row]
+
+    def sort(self, column: int, order: QtCore.Qt.SortOrder = QtCore.Qt.SortOrder.AscendingOrder):
+        keys = {
+            StockTableColumn.ID.value: self.stock_names,
+            StockTableColumn.NAME.value: self.long_names,
+            StockTableColumn.PRICE.value: self.prices,
+            StockTableColumn.DIFF.value: self.trends,
+            StockTableColumn.YIELD.value: self.yields
+        }.get(column)
+        if keys is None:
+            return
+        self.sort_column = column
+        self.sort_order = order
+        rows = sorted(range(len(keys)), key=lambda row: keys[row],
+                      reverse=order == QtCore.Qt.SortOrder.DescendingOrder)
+
+        self.layoutAboutToBeChanged.emit()
+        old_indices = self.persistentIndexList()
+        positions = {row: position for position, row in enumerate(rows)}
+        for values in (self.stock_names, self.long_names, self.prices, self.trends, self.yields, self.sparklines):
+            values[:] = [values[row] for row in rows]
+        self.filter_index.reorder(rows)
+        self.changePersistentIndexList(old_indices, [self.index(positions[index.row()], index.column())
+                                                     for index in old_indices])
+        self.layoutChanged.emit()
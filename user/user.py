@@ -96,18 +96,21 @@ class Portfolio:
         return self.get_current_value_cents(stocks) / 100
 
     def get_current_value_cents(self, stocks: Stonks):
-        values = [self.stocks[stock_name] * stocks.get_stock(stock_name).get_ask_price_cents() for stock_name in
-                  self.stocks.keys()]
+        # Stocks without price data are not counted
+        values = [self.stocks[stock.get_name()] * stock.get_ask_price_cents() for stock in
+                  stocks.load_stocks(list(self.stocks.keys()), load_meta_data=False)]
         return sum(values)
     
-    def get_predicted_value(self, stocks: Stonks) -> float:
-        return self.get_predicted_value_cents(stocks) / 100
+    def get_predicted_value(self, stocks: Stonks, predictions: dict = None) -> float:
+        return self.get_predicted_value_cents(stocks, predictions) / 100
 
-    def get_predicted_value_cents(self, stocks: Stonks) -> float:
+    def get_predicted_value_cents(self, stocks: Stonks, predictions: dict = None) -> float:
+        # Predictions can be passed in, e.g. cached ones, missing entries are skipped
         total_predicted_value = 0
-        for stock_name in self.stocks.keys():
-            prediction = stocks.get_stock(stock_name).get_prediction(365)
-            if not isnan(prediction[-1]):
+        if predictions is None:
+            predictions = stocks.get_predictions(list(self.stocks.keys()), 365)
+        for stock_name, prediction in predictions.items():
+            if prediction and not isnan(prediction[-1]):
                 total_predicted_value += prediction[-1] * self.stocks[stock_name] * 100
         return total_predicted_value
 
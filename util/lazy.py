@@ -0,0 +1,18 @@
+import importlib
+from types import ModuleType
+
+
+class LazyModule:
+    # Stands in for a heavy module and imports it on first attribute access
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: ModuleType = None
+
+    def __getattr__(self, attribute: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def is_loaded(self) -> bool:
+        return self._module is not None
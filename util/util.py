@@ -1,9 +1,12 @@
-from typing import List, Union
+from typing import List, Tuple, Union
+from urllib.parse import quote
 
 import numpy
 import pandas as pd
-import yfinance
-from math import isnan, nan
+
+from util.lazy import LazyModule
+
+yfinance = LazyModule("yfinance")
 
 MONTHS_IN_YEAR = 12
 
@@ -13,7 +16,9 @@ PRICE = "Price"
 ILLEGAL_CHARACTERS = ".:!?#&()[]{}/\\$§\"\'+-*@=|´`<> "
 
 
-def download_stock_data(stock_names: List[str], period: str = "7d"):
+def download_stock_data(stock_names: List[str], period: str = "7d", start: pd.Timestamp = None):
+    if start is not None:
+        return yfinance.download(stock_names, start=start)
     return yfinance.download(stock_names, period=period)
 
 
@@ -77,25 +82,22 @@ def add_time_stamp(date: pd.Timestamp, day: int = 0, month: int = 0, year: int =
                         year=current_year)
 
 
-def fill_data(data: pd.DataFrame, stock_name: str):
-    data_frame = pd.DataFrame()
+def fill_price_data(data: pd.DataFrame) -> Tuple[numpy.ndarray, numpy.ndarray, List[str]]:
+    # Map every calendar day onto the last trading day before it
+    close_data = data[TARGET_INDEX]
+    trading_days = close_data.index.values
+    time_stamps = numpy.arange(trading_days[0], trading_days[-1], numpy.timedelta64(1, "D"))
+    positions = numpy.searchsorted(trading_days, time_stamps, side="right") - 1
 
-    start_date = pd.Timestamp(data.index.values[0])
-    end_date = pd.Timestamp(data.index.values[-1])
+    # One contiguous row per stock
+    prices = numpy.ascontiguousarray(close_data.to_numpy(dtype=numpy.float64).T[:, positions])
+    return time_stamps, prices, [str(stock_name) for stock_name in close_data.columns]
 
-    time_stamps = get_date_period(start_date, end_date)
-    data_frame.index = time_stamps
 
-    stock_data = []
-    relevant_data = data[(TARGET_INDEX, stock_name)]
-    last_value = relevant_data[0]
-    for time_stamp in time_stamps:
-        if time_stamp.to_numpy() in relevant_data.index.values:
-            last_value = relevant_data.loc[time_stamp]
-        stock_data.append(last_value)
-
-    # Add column
-    data_frame[PRICE] = stock_data
+def fill_data(data: pd.DataFrame, stock_name: str):
+    time_stamps, prices, stock_names = fill_price_data(data)
+    data_frame = pd.DataFrame(index=time_stamps)
+    data_frame[PRICE] = prices[stock_names.index(stock_name)]
     return data_frame
 
 
@@ -109,16 +111,6 @@ def calculate_stock_trend(stock_prices: List[float], period: int = 7) -> float:
     return trend
 
 
-# def create_stock_infos(stock_names: List[str]):
-#    tickers = yfinance.Tickers(" ".join(stock_names))
-#    stock_infos = {}
-#    for stock_name in stock_names:
-#        info = tickers.tickers[stock_name].info
-#        if info:
-#            stock_infos[stock_name] = StockInfo(info)
-#    return stock_infos
-
-
 def get_value(key: str, info: dict):
     if key in info:
         return info[key]
@@ -126,12 +118,18 @@ def get_value(key: str, info: dict):
         return 0
 
 
+def fill_invalid(values: numpy.ndarray) -> numpy.ndarray:
+    # Overwrite non-positive and NaN entries with the previous valid value
+    if len(values) == 0:
+        return values
+    valid = values > 0
+    valid[0] = True
+    positions = numpy.maximum.accumulate(numpy.where(valid, numpy.arange(len(values)), 0))
+    return values[positions]
+
+
 def fix_results(results: List[float]):
-    # Overwrite negative entries with previous non-negative values
-    for i in range(1, len(results)):
-        if results[i] <= 0 or isnan(results[i]):
-            results[i] = results[i - 1]
-    return results
+    return fill_invalid(numpy.asarray(results, dtype=numpy.float64)).tolist()
 
 
 def sanitize_file_name(file_name: str):
@@ -141,7 +139,7 @@ def sanitize_file_name(file_name: str):
     return file_name
 
 
-def expand_time_stamps(time_stamps: List[numpy.datetime64], period: int):
-    for i in range(period):
-        time_stamps = numpy.append(time_stamps, add_time_stamp(pd.Timestamp(time_stamps[-1]), day=1).to_numpy())
-    return time_stamps
+def encode_file_name(file_name: str) -> str:
+    # Reversible, unlike sanitize_file_name, so that e.g. BRK-B and BRK.B get different files
+    return quote(file_name, safe="")
+
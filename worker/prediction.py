@@ -0,0 +1,52 @@
+from queue import Queue
+from threading import Lock
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from logs.log import log_message
+from stock_data.stocks import Stonks
+
+
+class PredictionWorker(QObject):
+    finished = pyqtSignal()
+    progress = pyqtSignal(str, int, list)  # Stock name, prediction period, prediction
+
+    def __init__(self, stonks_inst: Stonks):
+        super(PredictionWorker, self).__init__()
+        self.stonks_inst = stonks_inst
+        self.jobs = Queue()
+        self.pending = {}  # Mapping of [StockName: str, Period: int] of queued jobs
+        self.lock = Lock()
+
+    def request(self, stock_name: str, period: int):
+        # Jobs for the same stock are merged into one for the longest period
+        with self.lock:
+            if stock_name in self.pending:
+                self.pending[stock_name] = max(self.pending[stock_name], period)
+                return
+            self.pending[stock_name] = period
+        self.jobs.put(stock_name)
+
+    def stop(self):
+        # Drop everything that is still queued, only the running job is finished
+        with self.lock:
+            self.pending.clear()
+        self.jobs.put(None)
+
+    def run(self):
+        while True:
+            stock_name = self.jobs.get()
+            if stock_name is None:
+                break
+            with self.lock:
+                period = self.pending.pop(stock_name, None)
+            if period is None:
+                continue
+
+            try:
+                prediction = self.stonks_inst.get_stock(stock_name).get_prediction(period)
+            except Exception as exception:
+                log_message(f"Could not predict {stock_name}: {exception}")
+                prediction = []
+            self.progress.emit(stock_name, period, prediction)
+        self.finished.emit()
@@ -1,17 +1,37 @@
+from queue import Queue
+from typing import List
+
 from PyQt5.QtCore import QObject, pyqtSignal
-from stock_data.stocks import Stock, Stonks
+
+from logs.log import log_message
+from stock_data.stocks import Stonks
 
 
 class StockTableItemWorker(QObject):
     finished = pyqtSignal()
-    progress = pyqtSignal(Stock)
+    progress = pyqtSignal(list, list)  # Requested stock names, loaded stocks
 
     def __init__(self, stonks_inst: Stonks):
         super(StockTableItemWorker, self).__init__()
         self.stonks_inst = stonks_inst
-    
+        self.jobs = Queue()
+
+    def request(self, stock_names: List[str]):
+        self.jobs.put(list(stock_names))
+
+    def stop(self):
+        self.jobs.put(None)
+
     def run(self):
-        for stock_name in self.stonks_inst.get_stock_names():
-            stock = self.stonks_inst.get_stock(stock_name)
-            self.progress.emit(stock)
-        self.finished.emit()
\ No newline at end of file
+        # Meta data is resolved here, not on the GUI thread
+        while True:
+            stock_names = self.jobs.get()
+            if stock_names is None:
+                break
+            try:
+                stocks = self.stonks_inst.load_stocks(stock_names, load_meta_data=True)
+            except Exception as exception:
+                log_message(f"Could not load stocks {stock_names}: {exception}")
+                stocks = []
+            self.progress.emit(stock_names, stocks)
+        self.finished.emit()